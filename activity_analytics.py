@@ -0,0 +1,163 @@
+import numpy as np
+from datetime import datetime, timedelta, timezone
+from preprocessing import NEW_TAB_URL, format_duration
+
+def not_afk_periods(store, afk_bucket, since):
+  """Sorted, merged (starts, ends) arrays of the time the user wasn't AFK, like preprocessing.not_afk_periods"""
+  cursor = store.conn.cursor()
+  cursor.row_factory = None
+  rows = np.fromiter(
+    cursor.execute(
+      """
+      SELECT start, end FROM aw_events
+      WHERE bucket = ? AND end >= ? AND json_extract(data, '$.status') = 'not-afk'
+      ORDER BY start
+      """,
+      (afk_bucket, since)
+    ),
+    dtype=[("start", np.float64), ("end", np.float64)]
+  )
+  if len(rows) == 0:
+    return np.empty(0), np.empty(0)
+
+  # A period starts wherever an event begins after everything before it has ended
+  running_end = np.maximum.accumulate(rows["end"])
+  first = np.ones(len(rows), dtype=bool)
+  first[1:] = rows["start"][1:] > running_end[:-1]
+  last = np.append(np.flatnonzero(first)[1:] - 1, len(rows) - 1)
+  return rows["start"][first], running_end[last]
+
+def clip_to_periods(start, end, period_start, period_end):
+  """Vectorised preprocessing.clip_to_periods: (clipped starts, time inside the periods) per event"""
+  if len(period_start) == 0:
+    return start, np.zeros_like(start)
+
+  # Time covered by the periods up to t, from the running total at each period's start
+  covered_before = np.concatenate(([0.0], np.cumsum(period_end - period_start)[:-1]))
+  def covered(t):
+    i = np.maximum(np.searchsorted(period_start, t, side="right") - 1, 0)
+    # Before the first period this is 0 + 0
+    return covered_before[i] + np.clip(t - period_start[i], 0, period_end[i] - period_start[i])
+
+  # An event's clipped start is where the first period still open at its start begins
+  i = np.minimum(np.searchsorted(period_end, start, side="right"), len(period_start) - 1)
+  return np.maximum(start, period_start[i]), covered(end) - covered(start)
+
+class ActivityColumns:
+  """Web events as parallel NumPy columns, sorted by start time.
+
+  Timestamps and durations are float64 epoch seconds and domains are
+  interned into int32 ids, so reports are bincounts and sorts over arrays
+  instead of per-event dict loops.
+  """
+
+  def __init__(self, start, duration, domain_id, domains):
+    order = np.argsort(start, kind="stable")
+    self.start = np.asarray(start, dtype=np.float64)[order]
+    self.duration = np.asarray(duration, dtype=np.float64)[order]
+    self.domain_id = np.asarray(domain_id, dtype=np.int32)[order]
+    self.domains = list(domains)
+
+  @classmethod
+  def from_store(cls, store, bucket, since=None, min_duration=0, afk_bucket=None):
+    """Load from an ActivityStore's columns straight into arrays, without parsing the JSON.
+
+    New tabs and incognito windows are left out. With an afk_bucket, events
+    are clipped to the time the user wasn't AFK before the min_duration
+    threshold is applied, as in the prompt summary.
+    """
+    since = since.timestamp() if since is not None else 0.0
+    where = "bucket = ? AND end >= ? AND duration >= ? AND incognito = 0 AND COALESCE(url, '') != ?"
+    params = (bucket, since, min_duration, NEW_TAB_URL)
+
+    cursor = store.conn.cursor()
+    # Plain tuples go straight into a structured array; the constructor sorts by start
+    cursor.row_factory = None
+    rows = np.fromiter(
+      cursor.execute(f"SELECT start, end, duration, COALESCE(domain, '') FROM aw_events WHERE {where}", params),
+      dtype=[("start", np.float64), ("end", np.float64), ("duration", np.float64), ("domain", object)]
+    )
+    domains = {}
+    domain_id = np.fromiter(
+      (domains.setdefault(domain, len(domains)) for domain in rows["domain"]), dtype=np.int32, count=len(rows)
+    )
+    start, duration = rows["start"], rows["duration"]
+
+    if afk_bucket is not None:
+      period_start, period_end = not_afk_periods(store, afk_bucket, since)
+      start, duration = clip_to_periods(rows["start"], rows["end"], period_start, period_end)
+      kept = (duration > 0) & (duration >= min_duration)
+      start, duration, domain_id = start[kept], duration[kept], domain_id[kept]
+
+    return cls(start, duration, domain_id, domains)
+
+  def __len__(self):
+    return len(self.start)
+
+  def domain_totals(self):
+    """Seconds per domain id"""
+    return np.bincount(self.domain_id, weights=self.duration, minlength=len(self.domains))
+
+  def top_domains(self, n=10):
+    """(domain, seconds) for the n domains with the most time, most first"""
+    totals = self.domain_totals()
+    n = min(n, np.count_nonzero(totals))
+    if n == 0:
+      return []
+    top = np.argpartition(totals, -n)[-n:]
+    top = top[np.argsort(totals[top])[::-1]]
+    return [(self.domains[i], float(totals[i])) for i in top]
+
+  def _local_seconds(self):
+    # Fixed offset of the local timezone right now; good enough for reports
+    offset = datetime.now(timezone.utc).astimezone().utcoffset().total_seconds()
+    return self.start + offset
+
+  def hourly_histogram(self):
+    """Seconds per local hour of day (24 bins), attributing each event to the hour it started in"""
+    hours = (self._local_seconds() // 3600 % 24).astype(np.int64)
+    return np.bincount(hours, weights=self.duration, minlength=24)
+
+  def daily_totals(self):
+    """(local date, seconds) per day with any activity"""
+    days = (self._local_seconds() // 86400).astype(np.int64)
+    unique_days, day_index = np.unique(days, return_inverse=True)
+    totals = np.bincount(day_index, weights=self.duration)
+    return [
+      (datetime.fromtimestamp(int(day) * 86400, timezone.utc).date(), float(total))
+      for day, total in zip(unique_days, totals)
+    ]
+
+def screen_time_report(columns, top_n=10):
+  """Text report of total time, top domains, per-day totals and the busiest hours."""
+  if len(columns) == 0:
+    return "No web activity."
+
+  lines = [f"Total: {format_duration(columns.duration.sum())} over {len(columns)} events", "", "Top sites:"]
+  lines += [f"- {domain or 'other'}: {format_duration(seconds)}" for domain, seconds in columns.top_domains(top_n)]
+
+  lines += ["", "Per day:"]
+  lines += [f"- {day.strftime('%a %d-%m')}: {format_duration(seconds)}" for day, seconds in columns.daily_totals()]
+
+  hourly = columns.hourly_histogram()
+  busiest = np.argsort(hourly)[::-1][:3]
+  lines += ["", "Busiest hours: " + ", ".join(
+    f"{hour:02d}:00 ({format_duration(hourly[hour])})" for hour in busiest if hourly[hour] > 0
+  )]
+  return "\n".join(lines)
+
+if __name__ == '__main__':
+  from activity_store import ActivityStore
+  from config.config import config
+
+  store = ActivityStore(config.DATABASE_PATH, retention_hours=config.AW_RETENTION_HOURS)
+  try:
+    afk_bucket_name, window_bucket_name, web_bucket_name = store.bucket_names()
+    # Weekly report; only events since the last run are downloaded
+    store.sync(web_bucket_name, 24 * 7)
+    if afk_bucket_name:
+      store.sync(afk_bucket_name, 24 * 7)
+    since = datetime.now(timezone.utc) - timedelta(days=7)
+    print(screen_time_report(ActivityColumns.from_store(store, web_bucket_name, since=since, afk_bucket=afk_bucket_name)))
+  finally:
+    store.close()
@@ -0,0 +1,196 @@
+import json
+import requests
+from datetime import datetime, timedelta, timezone
+from dateutil import parser
+from preprocessing import BucketNotFoundError, get_bucket_names, get_domain_from_url
+from src.utils.sqlite import connect
+
+try:
+  import ijson
+except ImportError:  # optional; without it responses are parsed in one go
+  ijson = None
+
+AW_API_URL = "http://localhost:5600/api/0"
+# Order of the names returned by get_bucket_names
+BUCKET_KINDS = ("afk", "window", "web")
+
+SCHEMA = """
+  CREATE TABLE IF NOT EXISTS aw_events (
+    bucket TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    start REAL NOT NULL,
+    end REAL NOT NULL,
+    timestamp TEXT NOT NULL,
+    duration REAL NOT NULL,
+    data TEXT NOT NULL,
+    url TEXT,
+    domain TEXT,
+    incognito INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (bucket, id)
+  );
+  CREATE INDEX IF NOT EXISTS idx_aw_events_bucket_end ON aw_events (bucket, end);
+  CREATE TABLE IF NOT EXISTS aw_cursors (
+    bucket TEXT PRIMARY KEY,
+    last_start REAL NOT NULL,
+    synced_from REAL NOT NULL
+  );
+  CREATE TABLE IF NOT EXISTS aw_buckets (
+    kind TEXT PRIMARY KEY,
+    name TEXT NOT NULL
+  );
+"""
+
+# Fields of web events that also get their own column: (name, definition, value from the JSON)
+EVENT_COLUMNS = [
+  ("url", "TEXT", "json_extract(data, '$.url')"),
+  ("domain", "TEXT", "url_domain(json_extract(data, '$.url'))"),
+  ("incognito", "INTEGER NOT NULL DEFAULT 0", "COALESCE(json_extract(data, '$.incognito'), 0)")
+]
+
+def url_domain(url):
+  return get_domain_from_url(url) if url else None
+
+class ActivityStore:
+  """Local, time-indexed copy of ActivityWatch events.
+
+  Each bucket has a cursor at the start of the newest event seen so far, so a
+  sync only asks AW for events from there on. AW keeps extending its newest
+  event through heartbeats, which is why events are upserted by id: the
+  refetched event replaces the stored one with its longer duration. With
+  retention_hours, each sync also drops events older than that. The URL,
+  domain and incognito flag of web events are kept as columns too, so
+  reports can read them without parsing the JSON.
+  """
+
+  def __init__(self, path, api_url=AW_API_URL, retention_hours=None):
+    self.api_url = api_url
+    self.retention_hours = retention_hours
+    self.session = requests.Session()
+    self.conn = connect(path)
+    self.conn.executescript(SCHEMA)
+    self._migrate()
+
+  def _migrate(self):
+    # Stores created before these columns existed only have the values in the JSON
+    columns = {row["name"] for row in self.conn.execute("PRAGMA table_info(aw_events)")}
+    missing = [column for column in EVENT_COLUMNS if column[0] not in columns]
+    if not missing:
+      return
+    self.conn.create_function("url_domain", 1, url_domain)
+    with self.conn:
+      for name, definition, value in missing:
+        self.conn.execute(f"ALTER TABLE aw_events ADD COLUMN {name} {definition}")
+        self.conn.execute(f"UPDATE aw_events SET {name} = {value}")
+
+  def bucket_names(self):
+    """afk, window and web bucket names; AW is asked while one is unknown or after a cached one went missing"""
+    known = {row["kind"]: row["name"] for row in self.conn.execute("SELECT kind, name FROM aw_buckets")}
+    if len(known) < len(BUCKET_KINDS):
+      found = {kind: name for kind, name in zip(BUCKET_KINDS, get_bucket_names(self.api_url)) if name}
+      with self.conn:
+        self.conn.executemany(
+          "INSERT OR REPLACE INTO aw_buckets (kind, name) VALUES (?, ?)", list(found.items())
+        )
+      known.update(found)
+    return tuple(known.get(kind) for kind in BUCKET_KINDS)
+
+  def _fetch(self, bucket, start, end):
+    """Yield events as they're parsed off the response"""
+    params = {"start": start.isoformat(), "end": end.isoformat()}
+    with self.session.get(f"{self.api_url}/buckets/{bucket}/events", params=params, stream=True) as response:
+      if response.status_code == 404:
+        raise BucketNotFoundError(f"No bucket {bucket}")
+      if response.status_code != 200:
+        raise RuntimeError(f"Error retrieving events for {bucket}: {response.status_code}")
+      if ijson is None:
+        yield from response.json()
+      else:
+        response.raw.decode_content = True
+        # use_float keeps durations as floats rather than Decimals
+        yield from ijson.items(response.raw, "item", use_float=True)
+
+  def sync(self, bucket, hours):
+    """Bring the bucket up to date for the last `hours`; returns the number of events fetched"""
+    now = datetime.now(timezone.utc)
+    window_start = now - timedelta(hours=hours)
+
+    cursor = self.conn.execute(
+      "SELECT last_start, synced_from FROM aw_cursors WHERE bucket = ?", (bucket,)
+    ).fetchone()
+
+    ranges = []
+    if cursor is None:
+      ranges.append((window_start, now))
+      synced_from = window_start.timestamp()
+    else:
+      synced_from = cursor["synced_from"]
+      # Backfill only if this window reaches further back than anything fetched so far
+      if window_start.timestamp() < synced_from:
+        ranges.append((window_start, datetime.fromtimestamp(synced_from, timezone.utc)))
+        synced_from = window_start.timestamp()
+      ranges.append((datetime.fromtimestamp(cursor["last_start"], timezone.utc), now))
+
+    last_start = cursor["last_start"] if cursor is not None else window_start.timestamp()
+    fetched = 0
+    # Events are written as they stream in; a failed fetch rolls the whole sync back
+    try:
+      with self.conn:
+        for start, end in ranges:
+          for event in self._fetch(bucket, start, end):
+            event_start = parser.isoparse(event["timestamp"]).timestamp()
+            last_start = max(last_start, event_start)
+            data = event["data"]
+            self.conn.execute(
+              """
+              INSERT OR REPLACE INTO aw_events (bucket, id, start, end, timestamp, duration, data, url, domain, incognito)
+              VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+              """,
+              (
+                bucket, event["id"], event_start, event_start + event["duration"],
+                event["timestamp"], event["duration"], json.dumps(data),
+                data.get("url"), url_domain(data.get("url")), int(bool(data.get("incognito")))
+              )
+            )
+            fetched += 1
+        self.conn.execute(
+          "INSERT OR REPLACE INTO aw_cursors (bucket, last_start, synced_from) VALUES (?, ?, ?)",
+          (bucket, last_start, synced_from)
+        )
+    except BucketNotFoundError:
+      # Probably replaced by another watcher or browser; look all the names up again next time
+      with self.conn:
+        self.conn.execute("DELETE FROM aw_buckets")
+      raise
+
+    if self.retention_hours is not None:
+      # Never prune inside the window that was just asked for
+      self.prune(bucket, max(self.retention_hours, hours))
+    return fetched
+
+  def iter_events(self, bucket, hours):
+    """Stored events overlapping the last `hours`, oldest first, in AW's event format"""
+    window_start = (datetime.now(timezone.utc) - timedelta(hours=hours)).timestamp()
+    rows = self.conn.execute(
+      """
+      SELECT id, timestamp, duration, data FROM aw_events
+      WHERE bucket = ? AND end >= ?
+      ORDER BY start
+      """,
+      (bucket, window_start)
+    )
+    # Rows are read from the cursor as the caller consumes them
+    for row in rows:
+      yield {"id": row["id"], "timestamp": row["timestamp"], "duration": row["duration"], "data": json.loads(row["data"])}
+
+  def prune(self, bucket, keep_hours):
+    """Drop events that ended more than `keep_hours` ago"""
+    cutoff = (datetime.now(timezone.utc) - timedelta(hours=keep_hours)).timestamp()
+    with self.conn:
+      self.conn.execute("DELETE FROM aw_events WHERE bucket = ? AND end < ?", (bucket, cutoff))
+      self.conn.execute(
+        "UPDATE aw_cursors SET synced_from = MAX(synced_from, ?) WHERE bucket = ?", (cutoff, bucket)
+      )
+
+  def close(self):
+    self.session.close()
+    self.conn.close()
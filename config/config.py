@@ -12,7 +12,91 @@ class Config:
     OPENROUTER_MODEL: str = os.getenv("OPENROUTER_MODEL", "anthropic/claude-3-sonnet")
     ALLOWED_CHAT_ID: int = int(os.getenv("ALLOWED_CHAT_ID", "0"))
     MAX_HISTORY_LENGTH: int = 30
+
+    # "polling" or "webhook"; webhook mode serves updates over HTTP(S), e.g. behind a reverse proxy
+    BOT_MODE: str = os.getenv("BOT_MODE", "polling")
+    WEBHOOK_LISTEN: str = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+    WEBHOOK_PORT: int = int(os.getenv("WEBHOOK_PORT", "8443"))
+    WEBHOOK_URL: str = os.getenv("WEBHOOK_URL", "")  # public base URL Telegram posts to
+    WEBHOOK_PATH: str = os.getenv("WEBHOOK_PATH", "telegram")
+    WEBHOOK_SECRET_TOKEN: str = os.getenv("WEBHOOK_SECRET_TOKEN", "")  # checked against X-Telegram-Bot-Api-Secret-Token
+    # Only needed to terminate TLS here instead of at the proxy
+    WEBHOOK_CERT: Optional[str] = os.getenv("WEBHOOK_CERT") or None
+    WEBHOOK_KEY: Optional[str] = os.getenv("WEBHOOK_KEY") or None
+    WEBHOOK_MAX_CONNECTIONS: int = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))  # parallel deliveries from Telegram
+    # Updates from different chats are handled concurrently; each chat's stay in order
+    CONCURRENT_UPDATES: int = int(os.getenv("CONCURRENT_UPDATES", "8"))  # updates processed at once
+    CONCURRENT_UPDATES_MAX_PENDING: int = int(os.getenv("CONCURRENT_UPDATES_MAX_PENDING", "256"))
+    PROMPT_TOKEN_BUDGET: int = int(os.getenv("PROMPT_TOKEN_BUDGET", "4000"))  # system + tasks + history
+    # Models that need explicit cache_control breakpoints for prompt caching (others cache automatically)
+    PROMPT_CACHE_MODEL_PREFIXES: str = os.getenv("PROMPT_CACHE_MODEL_PREFIXES", "anthropic/,google/gemini")
+
+    # Messages evicted from the history window are folded into a running summary
+    SUMMARY_BATCH_SIZE: int = int(os.getenv("SUMMARY_BATCH_SIZE", "10"))  # evicted messages per summary call
+    SUMMARY_MODEL: Optional[str] = os.getenv("SUMMARY_MODEL") or None  # defaults to OPENROUTER_MODEL
+    SUMMARY_MAX_TOKENS: int = int(os.getenv("SUMMARY_MAX_TOKENS", "300"))
+    DATABASE_PATH: str = os.getenv("DATABASE_PATH", "data/kurisu.db")
+    CONVERSATION_STORE: str = os.getenv("CONVERSATION_STORE", "sqlite")  # "sqlite" or "memory"
     PROACTIVE_MESSAGE_MIN_INTERVAL: int = 3600  # 1 hour in seconds
     PROACTIVE_MESSAGE_MAX_INTERVAL: int = 14400  # 4 hours in seconds
+    # Let ActivityWatch aggregate web activity server-side (main-aw.py) instead of fetching raw events
+    AW_SERVER_SIDE_QUERY: bool = os.getenv("AW_SERVER_SIDE_QUERY", "false").lower() == "true"
+    AW_RETENTION_HOURS: float = float(os.getenv("AW_RETENTION_HOURS", "168"))  # local copy of AW events kept this long
+
+    # Calendar, sleep and Google Tasks context from the owner's Google account (see personal_google_auth.py)
+    GOOGLE_CONTEXT_ENABLED: bool = os.getenv("GOOGLE_CONTEXT_ENABLED", "false").lower() == "true"
+    GOOGLE_CALENDAR_TTL: float = float(os.getenv("GOOGLE_CALENDAR_TTL", "300"))  # seconds between refreshes
+    GOOGLE_SLEEP_TTL: float = float(os.getenv("GOOGLE_SLEEP_TTL", "3600"))
+    GOOGLE_TASKS_TTL: float = float(os.getenv("GOOGLE_TASKS_TTL", "300"))
+    # Proactive messages are only sent inside this window, in TIMEZONE
+    TIMEZONE: str = os.getenv("TIMEZONE", "UTC")
+    ACTIVE_HOURS_START: str = os.getenv("ACTIVE_HOURS_START", "09:00")
+    ACTIVE_HOURS_END: str = os.getenv("ACTIVE_HOURS_END", "22:00")
+    # Proactive messages are generated this long before they're due (0 generates at fire time)
+    PROACTIVE_PREGENERATE_LOOKAHEAD: int = int(os.getenv("PROACTIVE_PREGENERATE_LOOKAHEAD", "600"))
+    PROACTIVE_PREGENERATE_CONCURRENCY: int = int(os.getenv("PROACTIVE_PREGENERATE_CONCURRENCY", "1"))
+    REMINDER_LEAD_TIME: int = int(os.getenv("REMINDER_LEAD_TIME", "900"))  # remind 15 minutes before due
+
+    # Handling of proactive messages and reminders missed while the bot was down
+    MISFIRE_POLICY: str = os.getenv("MISFIRE_POLICY", "coalesce")  # "skip", "run_once" or "coalesce"
+    MISFIRE_GRACE_TIME: int = int(os.getenv("MISFIRE_GRACE_TIME", "300"))  # late by less than this runs normally
+    MISFIRE_SPREAD: int = int(os.getenv("MISFIRE_SPREAD", "600"))  # catch-ups are spread over this many seconds
+
+    # OpenRouter HTTP connection pool
+    OPENROUTER_HTTP2: bool = os.getenv("OPENROUTER_HTTP2", "true").lower() == "true"
+    OPENROUTER_TIMEOUT: float = float(os.getenv("OPENROUTER_TIMEOUT", "30"))
+    OPENROUTER_MAX_CONNECTIONS: int = int(os.getenv("OPENROUTER_MAX_CONNECTIONS", "10"))
+    OPENROUTER_MAX_KEEPALIVE_CONNECTIONS: int = int(os.getenv("OPENROUTER_MAX_KEEPALIVE_CONNECTIONS", "5"))
+    OPENROUTER_KEEPALIVE_EXPIRY: float = float(os.getenv("OPENROUTER_KEEPALIVE_EXPIRY", "300"))
+
+    # OpenRouter retries and client-side rate limiting (shared by all requests)
+    OPENROUTER_MAX_RETRIES: int = int(os.getenv("OPENROUTER_MAX_RETRIES", "4"))
+    OPENROUTER_BACKOFF_BASE: float = float(os.getenv("OPENROUTER_BACKOFF_BASE", "1.0"))
+    OPENROUTER_BACKOFF_MAX: float = float(os.getenv("OPENROUTER_BACKOFF_MAX", "30"))
+    OPENROUTER_RATE_LIMIT: float = float(os.getenv("OPENROUTER_RATE_LIMIT", "2"))  # requests per second, 0 disables
+    OPENROUTER_RATE_BURST: int = int(os.getenv("OPENROUTER_RATE_BURST", "5"))
+
+    # Cache for requests marked cacheable (e.g. summaries); disk tier shares DATABASE_PATH
+    RESPONSE_CACHE_ENABLED: bool = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+    RESPONSE_CACHE_MAX_ENTRIES: int = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "256"))
+    RESPONSE_CACHE_TTL: float = float(os.getenv("RESPONSE_CACHE_TTL", "86400"))
+    RESPONSE_CACHE_DISK: bool = os.getenv("RESPONSE_CACHE_DISK", "true").lower() == "true"
+
+    # Stream replies into Telegram by progressively editing a placeholder message
+    STREAM_RESPONSES: bool = os.getenv("STREAM_RESPONSES", "true").lower() == "true"
+    STREAM_EDIT_INTERVAL: float = float(os.getenv("STREAM_EDIT_INTERVAL", "1.0"))  # min seconds between edits
+    STREAM_PLACEHOLDER: str = "..."
+
+    # Messages from the same user within this window are answered as one turn; off by default since it
+    # delays every reply (messages sent while a reply is generating are still batched either way)
+    MESSAGE_DEBOUNCE_SECONDS: float = float(os.getenv("MESSAGE_DEBOUNCE_SECONDS", "0"))
+    MESSAGE_DEBOUNCE_MAX_WAIT: float = float(os.getenv("MESSAGE_DEBOUNCE_MAX_WAIT", "5.0"))
+
+    # Outbound queue for proactive messages and reminders, kept under Telegram's flood limits
+    OUTBOX_MAX_SIZE: int = int(os.getenv("OUTBOX_MAX_SIZE", "100"))  # proactive messages are skipped when full
+    OUTBOX_GLOBAL_RATE: float = float(os.getenv("OUTBOX_GLOBAL_RATE", "25"))  # messages per second, all chats
+    OUTBOX_PER_CHAT_INTERVAL: float = float(os.getenv("OUTBOX_PER_CHAT_INTERVAL", "1.0"))  # min seconds per chat
+    OUTBOX_WORKERS: int = int(os.getenv("OUTBOX_WORKERS", "3"))
+    OUTBOX_MAX_RETRIES: int = int(os.getenv("OUTBOX_MAX_RETRIES", "3"))
 
 config = Config() 
\ No newline at end of file
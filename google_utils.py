@@ -3,32 +3,66 @@ from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
 from google.auth.exceptions import RefreshError
 from googleapiclient.discovery import build
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import os
+import threading
 import pytz
 from tzlocal import get_localzone
 
 SCOPES = ['https://www.googleapis.com/auth/calendar.readonly', 'https://www.googleapis.com/auth/fitness.sleep.read', 'https://www.googleapis.com/auth/tasks.readonly']
 
+# Refresh access tokens this long before they expire rather than after a request fails
+REFRESH_MARGIN = timedelta(minutes=5)
+
+# Shared by every caller in the process; services hold a reference to the same credentials,
+# so refreshing them in place keeps the cached services authorised
+_creds = None
+_services = {}
+_lock = threading.Lock()
+
+def _save_creds(creds):
+  with open('token.json', 'w') as token:
+    token.write(creds.to_json())
+
+def _expires_soon(creds):
+  # google-auth keeps expiry as a naive UTC datetime
+  if creds.expiry is None:
+    return False
+  now = datetime.now(timezone.utc).replace(tzinfo=None)
+  return now + REFRESH_MARGIN >= creds.expiry
+
 def get_creds():
-  """Return OAuth credentials."""
-  creds = None
-  
-  # Check if token.json exists, if not, run the OAuth flow
-  if os.path.exists('token.json'):
-    creds = Credentials.from_authorized_user_file('token.json', SCOPES)
-  else:
-    flow = InstalledAppFlow.from_client_secrets_file('credentials.json', SCOPES)
-    creds = flow.run_local_server(port=0)
-    # Save the credentials for the next run
-    with open('token.json', 'w') as token:
-      token.write(creds.to_json())
-  
-  # Refresh the token if it's expired
-  if creds and creds.expired and creds.refresh_token:
-    creds.refresh(Request())
-  
-  return creds
+  """Return OAuth credentials, loaded once per process and refreshed shortly before expiry."""
+  global _creds
+
+  with _lock:
+    if _creds is None:
+      # Check if token.json exists, if not, run the OAuth flow
+      if os.path.exists('token.json'):
+        _creds = Credentials.from_authorized_user_file('token.json', SCOPES)
+      else:
+        flow = InstalledAppFlow.from_client_secrets_file('credentials.json', SCOPES)
+        _creds = flow.run_local_server(port=0)
+        # Save the credentials for the next run
+        _save_creds(_creds)
+
+    if _creds.refresh_token and (not _creds.valid or _expires_soon(_creds)):
+      _creds.refresh(Request())
+      _save_creds(_creds)
+
+    return _creds
+
+def get_service(name, version):
+  """Return a cached API service, built once per process from the bundled discovery document."""
+  creds = get_creds()
+
+  with _lock:
+    service = _services.get((name, version))
+    if service is None:
+      # static_discovery reads the document shipped with googleapiclient instead of fetching it
+      service = build(name, version, credentials=creds, static_discovery=True, cache_discovery=False)
+      _services[(name, version)] = service
+    return service
 # def get_creds():
 #     """Return OAuth credentials."""
 #     creds = None
@@ -59,24 +93,15 @@ def get_creds():
 
 def authenticate_google_calendar():
   """Authenticate and return Google Calendar API service."""
-  creds = get_creds()
-  
-  service = build('calendar', 'v3', credentials=creds)
-  return service
+  return get_service('calendar', 'v3')
 
 def authenticate_google_fitness():
   """Authenticate and return Google Fitness API service."""
-  creds = get_creds()
-  
-  service = build('fitness', 'v1', credentials=creds)
-  return service
+  return get_service('fitness', 'v1')
 
 def authenticate_google_tasks():
   """Authenticate and return Google Tasks API service."""
-  creds = get_creds()
-  
-  service = build('tasks', 'v1', credentials=creds)
-  return service
+  return get_service('tasks', 'v1')
 
 def get_calendar_events():
   """Fetch today's calendar events."""
@@ -1,27 +1,53 @@
-from preprocessing import get_web_activity
-from openai import OpenAI
+import asyncio
+from activity_store import ActivityStore
+from preprocessing import get_web_activity_summary
+from config.config import config
+from src.llm.cache import ResponseCache
+from src.llm.openrouter import OpenRouterClient
 
-if __name__ == '__main__':
-  web_activity_string = get_web_activity(24)
+async def main():
+  # Keeps a local copy of AW events so each run only downloads what's new
+  store = ActivityStore(config.DATABASE_PATH, retention_hours=config.AW_RETENTION_HOURS)
+  try:
+    # Sessions and per-site totals rather than one line per raw event keep the prompt small
+    web_activity_string = get_web_activity_summary(24, store=store, server_side=config.AW_SERVER_SIDE_QUERY)
+  finally:
+    store.close()
 
-  client = OpenAI(
+  # Identical activity + temperature=0 gives the same analysis, so serve repeats from the cache
+  cache = None
+  if config.RESPONSE_CACHE_ENABLED:
+    cache = ResponseCache(
+      max_entries=config.RESPONSE_CACHE_MAX_ENTRIES,
+      ttl=config.RESPONSE_CACHE_TTL,
+      path=config.DATABASE_PATH if config.RESPONSE_CACHE_DISK else None
+    )
+  client = OpenRouterClient(
     base_url = 'http://localhost:11434/v1',
     api_key='ollama', # required, but unused
+    # model="llama3",
+    model = "llama3-8b-instruct",
+    response_cache=cache
   )
   print(web_activity_string)
 
-  stream = client.chat.completions.create(
-    # model="llama3",
-    model = "llama3-8b-instruct",
+  stream = client.stream_response(
     messages = [
     {"role": "system", "content": "Analyze the following web activity and respond only with a succinct description of the web activity. Do not include any introductions or explanations in your response."},
     {"role": "system", "content": f"Web activity:\n\n{web_activity_string}"},
     {"role": "user", "content": "Analyze the provided web activity of the last 24hs. Provide a short list of user activities"}
     ],
-    stream=True, 
-    temperature=0
+    temperature=0,
+    cacheable=True
   )
 
-  for chunk in stream:
-    if chunk.choices[0].delta.content is not None:
-      print(chunk.choices[0].delta.content, end="")
+  try:
+    async for chunk in stream:
+      print(chunk, end="", flush=True)
+  finally:
+    await client.aclose()
+    if cache is not None:
+      await cache.close()
+
+if __name__ == '__main__':
+  asyncio.run(main())
\ No newline at end of file
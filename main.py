@@ -3,6 +3,7 @@ from telegram import Update
 from telegram.ext import Application, CommandHandler, MessageHandler, filters
 from src.bot.telegram_bot import KurisuBot
 from src.bot.handlers import CommandHandlers
+from src.bot.updates import ChatOrderedUpdateProcessor
 from config.config import config
 
 # Setup logging
@@ -12,13 +13,58 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+def run_webhook(application: Application):
+    """Serve updates over HTTP(S); TLS is terminated here only if a cert is configured"""
+    if not config.WEBHOOK_URL:
+        raise ValueError("WEBHOOK_URL must be set in webhook mode")
+    if not config.WEBHOOK_SECRET_TOKEN:
+        logger.warning("WEBHOOK_SECRET_TOKEN is not set; webhook requests won't be authenticated")
+    if bool(config.WEBHOOK_CERT) != bool(config.WEBHOOK_KEY):
+        raise ValueError("WEBHOOK_CERT and WEBHOOK_KEY must be set together")
+
+    path = config.WEBHOOK_PATH.strip("/")
+    logger.info(f"Starting bot with webhook on {config.WEBHOOK_LISTEN}:{config.WEBHOOK_PORT}/{path}...")
+    application.run_webhook(
+        listen=config.WEBHOOK_LISTEN,
+        port=config.WEBHOOK_PORT,
+        url_path=path,
+        webhook_url=f"{config.WEBHOOK_URL.rstrip('/')}/{path}",
+        secret_token=config.WEBHOOK_SECRET_TOKEN or None,
+        cert=config.WEBHOOK_CERT,
+        key=config.WEBHOOK_KEY,
+        max_connections=config.WEBHOOK_MAX_CONNECTIONS,
+        allowed_updates=Update.ALL_TYPES
+    )
+
 def main():
     # Initialize bot and handlers
     bot = KurisuBot()
     handlers = CommandHandlers(bot)
     
+    async def post_init(application: Application):
+        await bot.post_init(application)
+
+    async def post_stop(application: Application):
+        # Runs before the bot's HTTP client is shut down, so queued messages can still be sent
+        await bot.stop()
+
+    async def post_shutdown(application: Application):
+        # Release the pooled LLM connections once the bot stops
+        await bot.shutdown()
+
     # Create application
-    application = Application.builder().token(config.TELEGRAM_TOKEN).build()
+    application = (
+        Application.builder()
+        .token(config.TELEGRAM_TOKEN)
+        .post_init(post_init)
+        .post_stop(post_stop)
+        .post_shutdown(post_shutdown)
+        .concurrent_updates(ChatOrderedUpdateProcessor(
+            workers=max(1, config.CONCURRENT_UPDATES),
+            max_pending=config.CONCURRENT_UPDATES_MAX_PENDING
+        ))
+        .build()
+    )
     
     # Add handlers
     application.add_handler(CommandHandler("start", bot.start))
@@ -33,8 +79,13 @@ def main():
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, bot.handle_message))
     
     # Start the bot
-    logger.info("Starting bot...")
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    if config.BOT_MODE == "webhook":
+        run_webhook(application)
+    elif config.BOT_MODE == "polling":
+        logger.info("Starting bot...")
+        application.run_polling(allowed_updates=Update.ALL_TYPES)
+    else:
+        raise ValueError(f"Unknown BOT_MODE {config.BOT_MODE!r}, expected 'polling' or 'webhook'")
 
 if __name__ == "__main__":
     try:
@@ -7,13 +7,17 @@ from googleapiclient.errors import HttpError
 import os
 import json
 import logging
+import threading
 from typing import Optional, Dict
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import pytz
 from tzlocal import get_localzone
 
 logger = logging.getLogger(__name__)
 
+# Refresh access tokens this long before they expire rather than after a request fails
+REFRESH_MARGIN = timedelta(minutes=5)
+
 class PersonalGoogleAuth:
     """Handles authentication for personal Google account access."""
     
@@ -28,6 +32,8 @@ class PersonalGoogleAuth:
         self.token_path = os.getenv('GOOGLE_TOKEN_PATH')
         self._creds = None
         self._services = {}
+        # Sources are fetched from parallel worker threads; one at a time may load or write the token
+        self._lock = threading.Lock()
 
     @staticmethod
     def generate_persistent_token(credentials_path: str, token_save_path: str) -> None:
@@ -59,21 +65,34 @@ class PersonalGoogleAuth:
         print(f"Persistent token generated and saved to {token_save_path}")
         print("You can now copy this file to your server")
 
-    def authenticate(self) -> None:
-        """Authenticate using saved refresh token."""
+    def authenticate(self, force_refresh: bool = False) -> None:
+        """Authenticate using saved refresh token. Safe to call from several threads."""
+        with self._lock:
+            self._authenticate(force_refresh)
+
+    def _expires_soon(self) -> bool:
+        # google-auth keeps expiry as a naive UTC datetime
+        if self._creds.expiry is None:
+            return False
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        return now + REFRESH_MARGIN >= self._creds.expiry
+
+    def _authenticate(self, force_refresh: bool = False) -> None:
         try:
-            if not os.path.exists(self.token_path):
-                raise FileNotFoundError(
-                    "Token file not found. Run generate_persistent_token() locally first."
-                )
+            # Loaded once; cached services hold these credentials, so they are refreshed in place
+            if self._creds is None:
+                if not os.path.exists(self.token_path):
+                    raise FileNotFoundError(
+                        "Token file not found. Run generate_persistent_token() locally first."
+                    )
 
-            self._creds = Credentials.from_authorized_user_file(
-                self.token_path, 
-                self.SCOPES
-            )
+                self._creds = Credentials.from_authorized_user_file(
+                    self.token_path, 
+                    self.SCOPES
+                )
 
-            # Refresh if expired
-            if self._creds.expired:
+            # Refresh shortly before expiry, or when the API has rejected the token
+            if force_refresh or not self._creds.valid or self._expires_soon():
                 self._creds.refresh(Request())
                 # Save the refreshed credentials
                 with open(self.token_path, 'w') as token:
@@ -93,19 +112,21 @@ class PersonalGoogleAuth:
         """Get or create a Google service client."""
         service_key = f"{service_name}_{version}"
         
-        if service_key not in self._services:
-            if not self._creds or self._creds.expired:
-                self.authenticate()
+        with self._lock:
+            self._authenticate()
+            if service_key not in self._services:
+                # Use the discovery document bundled with googleapiclient; no network round trip
+                self._services[service_key] = build(
+                    service_name,
+                    version,
+                    credentials=self._creds,
+                    static_discovery=True,
+                    cache_discovery=False
+                )
             
-            self._services[service_key] = build(
-                service_name,
-                version,
-                credentials=self._creds
-            )
-        
-        return self._services[service_key]
+            return self._services[service_key]
 
-# Service methods implementation
+# Service methods implementation; API errors other than an expired token are raised to the caller
     def get_calendar_events(self) -> str:
         """Fetch today's calendar events."""
         try:
@@ -131,9 +152,9 @@ class PersonalGoogleAuth:
         except HttpError as e:
             logger.error(f"Calendar API error: {e}")
             if e.status_code == 401:
-                self.authenticate()
+                self.authenticate(force_refresh=True)
                 return self.get_calendar_events()
-            return "Unable to fetch calendar events"
+            raise
 
     def get_sleep_data(self) -> list:
         """Fetch sleep data for the last 24 hours."""
@@ -161,9 +182,9 @@ class PersonalGoogleAuth:
         except HttpError as e:
             logger.error(f"Fitness API error: {e}")
             if e.status_code == 401:
-                self.authenticate()
+                self.authenticate(force_refresh=True)
                 return self.get_sleep_data()
-            return []
+            raise
 
     def get_tasks(self) -> str:
         """Fetch tasks from all lists."""
@@ -178,9 +199,9 @@ class PersonalGoogleAuth:
         except HttpError as e:
             logger.error(f"Tasks API error: {e}")
             if e.status_code == 401:
-                self.authenticate()
+                self.authenticate(force_refresh=True)
                 return self.get_tasks()
-            return "Unable to fetch tasks"
+            raise
 
     @staticmethod
     def _format_calendar_events(events):
@@ -1,10 +1,29 @@
-# import json
+import functools
+import json
 import requests
 from datetime import datetime, timedelta, timezone
 from dateutil import parser
 from urllib.parse import urlparse
 import re
 
+try:
+  import ijson
+except ImportError:  # optional; without it responses are parsed in one go
+  ijson = None
+
+# Leading emoji, notification counters and the like in page titles
+LEADING_SYMBOLS = re.compile(r'^[^a-zA-Z0-9]+\s*')
+NEW_TAB_URL = "chrome://newtab/"
+# Window watcher app names of the browsers aw-watcher-web supports, as used in AW's own queries
+BROWSER_APPS = [
+  "Google Chrome", "Google-chrome", "chrome.exe", "google-chrome-stable", "Chromium", "Chromium-browser",
+  "chromium.exe", "Brave-browser", "Firefox", "Firefox.exe", "firefox", "firefox.exe", "Firefox-esr",
+  "Firefox Developer Edition", "Nightly", "org.mozilla.firefox", "Microsoft-edge", "msedge.exe"
+]
+
+class BucketNotFoundError(RuntimeError):
+  """AW has no bucket by that name, e.g. because a watcher replaced it"""
+
 # Receives url, returns bucket names: afk_bucket_name, window_bucket_name, web_bucket_name
 def get_bucket_names(api_url):
   try:
@@ -31,6 +50,27 @@ def get_bucket_names(api_url):
     raise RuntimeError("Error retrieving bucket metadata")
 
 
+def iter_bucket_events(api_url, bucket_name, hours):
+  """Yield a bucket's events for the last `hours` as they're parsed off the response."""
+  current_time_utc = datetime.now(timezone.utc)
+  threshold_time_utc = current_time_utc - timedelta(hours=hours)
+  params = {
+    "start": threshold_time_utc.isoformat(),
+    "end": current_time_utc.isoformat()
+  }
+
+  with requests.get(f"{api_url}/buckets/{bucket_name}/events", params=params, stream=True) as response:
+    if response.status_code == 404:
+      raise BucketNotFoundError(f"No bucket {bucket_name}")
+    if response.status_code != 200:
+      raise RuntimeError("Error retrieving bucket events")
+    if ijson is None:
+      yield from response.json()
+    else:
+      response.raw.decode_content = True
+      # use_float keeps durations as floats rather than Decimals
+      yield from ijson.items(response.raw, "item", use_float=True)
+
 def get_bucket_events(api_url, bucket_name, hours):
   try:
     # Get the current time in UTC
@@ -54,72 +94,339 @@ def get_bucket_events(api_url, bucket_name, hours):
   except:
     raise RuntimeError("Error retrieving bucket events")
 
+def get_domain_from_hostname(hostname):
+  # Split the hostname by dots
+  parts = hostname.split('.')
+  # If the hostname has more than two parts (e.g., subdomain.domain.com), ignore the subdomains
+  if len(parts) > 2:
+    return '.'.join(parts[-2:])
+  return hostname
+
 def get_domain_from_url(url):
   parsed_url = urlparse(url)
   # Extract the hostname
   hostname = parsed_url.hostname
   if hostname:
-    # Split the hostname by dots
-    parts = hostname.split('.')
-    # If the hostname has more than two parts (e.g., subdomain.domain.com), ignore the subdomains
-    if len(parts) > 2:
-      domain = '.'.join(parts[-2:])
-    else:
-      domain = hostname
-    return domain
+    return get_domain_from_hostname(hostname)
   return ''
 
+# Predicates and transforms work on a single event so they can be fused into one pass
+
+def has_duration(event):
+  return event['duration'] != 0
+
+def is_not_incognito(event):
+  return not event['data'].get('incognito', False)
+
+def is_not_new_tab(event):
+  return event['data'].get('url') != NEW_TAB_URL
+
+def lasts_at_least(min_duration):
+  def predicate(event):
+    return event['duration'] >= min_duration
+  return predicate
+
+def clean_title(event):
+  """Copy of the event with leading symbols stripped from its title; the input is left untouched."""
+  title = event['data'].get('title', '')
+  cleaned = LEADING_SYMBOLS.sub('', title)
+  if cleaned == title:
+    return event
+  return {**event, 'data': {**event['data'], 'title': cleaned}}
+
+def keep(*predicates):
+  """Stage that drops events failing any of the predicates."""
+  def stage(events):
+    for event in events:
+      for predicate in predicates:
+        if not predicate(event):
+          break
+      else:
+        yield event
+  return stage
+
+def transform(*functions):
+  """Stage that applies each function to every event, in order."""
+  def stage(events):
+    for event in events:
+      for function in functions:
+        event = function(event)
+      yield event
+  return stage
+
+def pipeline(events, *stages):
+  """Chain stages lazily: each event flows through all of them before the next is read."""
+  for stage in stages:
+    events = stage(events)
+  return events
+
+def web_event_stages(min_duration=60, clean_titles=False):
+  stages = [keep(has_duration, is_not_incognito, is_not_new_tab, lasts_at_least(min_duration))]
+  if clean_titles:
+    stages.append(transform(clean_title))
+  return stages
+
 def remove_duration_zero(events):
-  result = [event for event in events if event['duration'] != 0]
-  return result
+  return list(keep(has_duration)(events))
 
 def remove_incognito(events):
-  result = [event for event in events if event['data']['incognito'] == False]
-  return result
+  return list(keep(is_not_incognito)(events))
 
 def remove_new_tabs(events):
-  result = [event for event in events if event['data']['url'] != "chrome://newtab/"]
-  return result
+  return list(keep(is_not_new_tab)(events))
 
 def remove_short_events(events, min_duration=60):
-  result = [event for event in events if event['duration'] >= min_duration]
-  return result
+  return list(keep(lasts_at_least(min_duration))(events))
 
 def clean_special_characters(events):
-  cleaned_events = []
-  for event in events:
-    event['data']['title'] = re.sub(r'^[^a-zA-Z0-9]+\s*', '', event['data']['title'])
-    cleaned_events.append(event)
-  return cleaned_events
+  return list(transform(clean_title)(events))
 
 def filter_web_events(web_events):
-  web_events = remove_incognito(web_events)
-  web_events = remove_new_tabs(web_events)
-  web_events = remove_short_events(web_events, 60)
-
-  return web_events
-
-def get_web_activity(period=1):
+  return list(pipeline(web_events, *web_event_stages(60)))
+
+def add_interval(event):
+  """Copy of the event with its start and end as epoch seconds, parsed once for later stages."""
+  start = parser.isoparse(event['timestamp']).timestamp()
+  return {**event, 'start': start, 'end': start + event['duration']}
+
+def not_afk_periods(afk_events):
+  """Sorted, merged [start, end] epoch intervals in which the user wasn't AFK."""
+  periods = sorted(
+    (event['start'], event['end'])
+    for event in map(add_interval, afk_events)
+    if event['data'].get('status') == 'not-afk'
+  )
+  merged = []
+  for start, end in periods:
+    if merged and start <= merged[-1][1]:
+      merged[-1][1] = max(merged[-1][1], end)
+    else:
+      merged.append([start, end])
+  return merged
+
+def clip_to_periods(periods):
+  """Stage keeping only the part of each event inside `periods`; events must arrive oldest first."""
+  def stage(events):
+    first = 0
+    for event in events:
+      # Periods that ended before this event can't overlap any later event either
+      while first < len(periods) and periods[first][1] <= event['start']:
+        first += 1
+
+      active = 0.0
+      start = end = None
+      i = first
+      while i < len(periods) and periods[i][0] < event['end']:
+        overlap_start = max(event['start'], periods[i][0])
+        overlap_end = min(event['end'], periods[i][1])
+        active += overlap_end - overlap_start
+        start = overlap_start if start is None else start
+        end = overlap_end
+        i += 1
+
+      if active > 0:
+        yield {**event, 'start': start, 'end': end, 'duration': active}
+  return stage
+
+def sessionize(max_gap=300):
+  """Stage merging events on the same domain into sessions, ending one after `max_gap` idle seconds.
+
+  Quick switches to another tab and back don't split a session, so sessions
+  on different domains may overlap. Events must arrive oldest first and carry
+  a start/end (see add_interval); sessions come out in order of their end.
+  Each session records its active duration and the time spent per title.
+  """
+  def stage(events):
+    open_sessions = {}
+    for event in events:
+      # Close sessions that have been idle too long; they can't be extended anymore
+      for domain in [d for d, session in open_sessions.items() if event['start'] - session['end'] > max_gap]:
+        yield open_sessions.pop(domain)
+
+      domain = get_domain_from_url(event['data'].get('url', ''))
+      session = open_sessions.get(domain)
+      if session is None:
+        session = open_sessions[domain] = {
+          'domain': domain, 'start': event['start'], 'end': event['end'], 'duration': 0.0, 'titles': {}
+        }
+      session['end'] = max(session['end'], event['end'])
+      session['duration'] += event['duration']
+      title = event['data'].get('title', '')
+      session['titles'][title] = session['titles'].get(title, 0) + event['duration']
+
+    yield from sorted(open_sessions.values(), key=lambda session: session['end'])
+  return stage
+
+def domain_totals(sessions):
+  """(domain, seconds) pairs, most time first."""
+  totals = {}
+  for session in sessions:
+    totals[session['domain']] = totals.get(session['domain'], 0) + session['duration']
+  return sorted(totals.items(), key=lambda item: item[1], reverse=True)
+
+def format_duration(seconds):
+  minutes = int(seconds / 60)
+  if minutes < 60:
+    return f"{minutes}min"
+  return f"{minutes // 60}h {minutes % 60:02d}min"
+
+def format_session(session, max_titles=3):
+  start = datetime.fromtimestamp(session['start']).strftime('%I:%M %p')
+  end = datetime.fromtimestamp(session['end']).strftime('%I:%M %p')
+  titles = sorted(session['titles'], key=session['titles'].get, reverse=True)[:max_titles]
+  quoted = ", ".join(f"'{title}'" for title in titles if title)
+  return f"{start}-{end}: {session['domain']} ({format_duration(session['duration'])}) {quoted}".rstrip()
+
+def format_web_event(event):
+  event_time = parser.isoparse(event['timestamp'])
+  local_time = event_time.astimezone()
+
+  formatted_time = local_time.strftime('%I:%M %p')
+  domain = get_domain_from_url(event['data']['url'])
+
+  duration = int(event['duration'] / 60)
+
+  return f"{formatted_time}: Activity ({duration}min) '{event['data']['title']}' (Browser, {domain})"
+
+def bucket_names(api_url, store=None):
+  """get_bucket_names, served from the local store when given so AW isn't asked on every run"""
+  if store is not None:
+    return store.bucket_names()
+  return get_bucket_names(api_url)
+
+def retry_with_fresh_bucket_names(function):
+  """Run `function` once more if one of the bucket names it used no longer exists.
+
+  The store forgets its cached names when AW reports a bucket missing, so the
+  second run looks them up again.
+  """
+  @functools.wraps(function)
+  def wrapper(*args, **kwargs):
+    try:
+      return function(*args, **kwargs)
+    except BucketNotFoundError:
+      return function(*args, **kwargs)
+  return wrapper
+
+def iter_chronological(api_url, bucket_name, hours, store=None):
+  """A bucket's events oldest first, from the local store when given."""
+  if store is not None:
+    store.sync(bucket_name, hours)
+    return store.iter_events(bucket_name, hours)
+  # AW returns the newest event first
+  return sorted(iter_bucket_events(api_url, bucket_name, hours), key=lambda event: event['timestamp'])
+
+def query_web_activity(api_url, afk_bucket_name, web_bucket_name, hours, top_titles=50, window_bucket_name=None):
+  """Let AW's /query/ endpoint drop AFK time and aggregate per domain and per page.
+
+  With a window bucket, web events are also cut down to the time a browser
+  window had focus, since the extension keeps reporting the active tab of a
+  browser sitting in the background. Only the merged, duration-sorted
+  results cross the wire. Returns {"domains": [...], "titles": [...]} events.
+  """
+  current_time_utc = datetime.now(timezone.utc)
+  threshold_time_utc = current_time_utc - timedelta(hours=hours)
+
+  query = [f"web = query_bucket({json.dumps(web_bucket_name)});"]
+  if afk_bucket_name:
+    query += [
+      f"not_afk = filter_keyvals(query_bucket({json.dumps(afk_bucket_name)}), \"status\", [\"not-afk\"]);",
+      "web = filter_period_intersect(web, not_afk);"
+    ]
+  if window_bucket_name:
+    query += [
+      f"browser = filter_keyvals(query_bucket({json.dumps(window_bucket_name)}), \"app\", {json.dumps(BROWSER_APPS)});",
+      "web = filter_period_intersect(web, browser);"
+    ]
+  query += [
+    f"web = exclude_keyvals(web, \"url\", [{json.dumps(NEW_TAB_URL)}]);",
+    # Adds $domain to each event's data
+    "web = split_url_events(web);",
+    # incognito is kept as a key so those events can be dropped from the merged result
+    "domains = sort_by_duration(merge_events_by_keys(web, [\"$domain\", \"incognito\"]));",
+    "titles = sort_by_duration(merge_events_by_keys(web, [\"$domain\", \"title\", \"incognito\"]));",
+    f"RETURN = {{\"domains\": domains, \"titles\": limit_events(titles, {int(top_titles)})}};"
+  ]
+
+  response = requests.post(f"{api_url}/query/", json={
+    "timeperiods": [f"{threshold_time_utc.isoformat()}/{current_time_utc.isoformat()}"],
+    "query": query
+  })
+  if response.status_code != 200:
+    raise RuntimeError(f"Error running AW query: {response.status_code} {response.text}")
+  # One result per time period
+  return response.json()[0]
+
+def format_query_result(result, min_duration=60, top_domains=10, top_titles=15):
+  """Prompt text for query_web_activity's result, in the same shape as the local summary."""
+  totals = {}
+  for event in keep(is_not_incognito)(result['domains']):
+    domain = get_domain_from_hostname(event['data'].get('$domain', '')) or 'other'
+    totals[domain] = totals.get(domain, 0) + event['duration']
+  ranked = sorted(totals.items(), key=lambda item: item[1], reverse=True)
+  if not ranked:
+    return "No web activity."
+
+  pages = pipeline(result['titles'], keep(is_not_incognito, lasts_at_least(min_duration)), transform(clean_title))
+  totals_text = "\n".join(f"- {domain}: {format_duration(seconds)}" for domain, seconds in ranked[:top_domains])
+  pages_text = "\n".join(
+    f"- {get_domain_from_hostname(event['data'].get('$domain', ''))}: "
+    f"'{event['data'].get('title', '')}' ({format_duration(event['duration'])})"
+    for _, event in zip(range(top_titles), pages)
+  )
+  return f"Time per site:\n{totals_text}\n\nTop pages:\n{pages_text}"
+
+@retry_with_fresh_bucket_names
+def get_web_activity_summary(period=1, store=None, max_gap=300, min_session=60, top_domains=10, server_side=False):
+  """Per-domain totals and browsing sessions, with AFK time removed, as prompt text.
+
+  With server_side, AW does the filtering and aggregation instead and the
+  result lists top pages rather than a session timeline.
+  """
   url = "http://localhost:5600/api/0"
-  afk_bucket_name, window_bucket_name, web_bucket_name = get_bucket_names(url)
-
-  web_activity_raw = get_bucket_events(url, web_bucket_name, period)
-  web_activity = filter_web_events(web_activity_raw)
-
-  result = []
-  for event in web_activity:
-    event_time = parser.isoparse(event['timestamp'])
-    local_time = event_time.astimezone()
-
-    formatted_time = local_time.strftime('%I:%M %p')
-    domain = get_domain_from_url(event['data']['url'])
-
-    duration = int(event['duration'] / 60)
-
-    line = f"{formatted_time}: Activity ({duration}min) '{event['data']['title']}' (Browser, {domain})"
-    result.append(line)
-  
-  return "\n".join(result)
+  afk_bucket_name, window_bucket_name, web_bucket_name = bucket_names(url, store)
+
+  if server_side:
+    result = query_web_activity(url, afk_bucket_name, web_bucket_name, period, window_bucket_name=window_bucket_name)
+    return format_query_result(result, min_duration=min_session, top_domains=top_domains)
+
+  stages = [
+    keep(has_duration, is_not_incognito, is_not_new_tab),
+    transform(clean_title, add_interval)
+  ]
+  if afk_bucket_name:
+    afk_events = iter_chronological(url, afk_bucket_name, period, store)
+    stages.append(clip_to_periods(not_afk_periods(afk_events)))
+  # Short visits are kept until here so they can still extend a session
+  stages += [sessionize(max_gap), keep(lasts_at_least(min_session))]
+
+  sessions = list(pipeline(iter_chronological(url, web_bucket_name, period, store), *stages))
+  sessions.sort(key=lambda session: session['start'])
+  if not sessions:
+    return "No web activity."
+
+  totals = "\n".join(
+    f"- {domain or 'other'}: {format_duration(seconds)}"
+    for domain, seconds in domain_totals(sessions)[:top_domains]
+  )
+  timeline = "\n".join(format_session(session) for session in sessions)
+  return f"Time per site:\n{totals}\n\nSessions:\n{timeline}"
+
+@retry_with_fresh_bucket_names
+def get_web_activity(period=1, store=None, stages=None):
+  url = "http://localhost:5600/api/0"
+  afk_bucket_name, window_bucket_name, web_bucket_name = bucket_names(url, store)
+
+  if store is not None:
+    # Only events newer than the last sync are downloaded; the rest come from the local store
+    store.sync(web_bucket_name, period)
+    web_activity_raw = store.iter_events(web_bucket_name, period)
+  else:
+    web_activity_raw = iter_bucket_events(url, web_bucket_name, period)
+
+  # Events are filtered and formatted one at a time, without intermediate lists
+  web_activity = pipeline(web_activity_raw, *(stages if stages is not None else web_event_stages(60)))
+  return "\n".join(format_web_event(event) for event in web_activity)
     
 
 
@@ -27,6 +27,7 @@ Available commands:
     @authorized_only()
     async def add_task(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         user_id = update.effective_user.id
+        await self.bot.task_manager.load_tasks(user_id)
         
         if not context.args:
             await update.message.reply_text(
@@ -62,6 +63,7 @@ Available commands:
     @authorized_only()
     async def list_tasks(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         user_id = update.effective_user.id
+        await self.bot.task_manager.load_tasks(user_id)
         tasks = self.bot.task_manager.get_tasks(user_id)
         
         if not tasks:
@@ -79,6 +81,7 @@ Available commands:
     @authorized_only()
     async def complete_task(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         user_id = update.effective_user.id
+        await self.bot.task_manager.load_tasks(user_id)
         
         if not context.args:
             await update.message.reply_text("Please specify the task number to complete.")
@@ -96,7 +99,7 @@ Available commands:
     @authorized_only()
     async def pause_notifications(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         user_id = update.effective_user.id
-        self.bot.scheduler.stop_scheduling(user_id)
+        self.bot.scheduler.pause_scheduling(user_id)
         await update.message.reply_text(
             "Fine! I'll stop checking up on you... but don't blame me if you fall behind!"
         )
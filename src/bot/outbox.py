@@ -0,0 +1,112 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+from telegram import Bot
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter
+from src.utils.helpers import retry_after_seconds
+from src.utils.rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class OutboundMessage:
+    chat_id: int
+    text: str
+    attempts: int = 0
+
+class OutboundQueue:
+    """Bounded queue for bot-initiated messages (proactive messages, reminders).
+
+    Workers send through a global token bucket and one bucket per chat, so
+    bursts of timers firing together stay under Telegram's flood limits. A
+    RetryAfter pauses the global bucket and the message is requeued.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 100,
+        global_rate: float = 25,
+        per_chat_interval: float = 1.0,
+        workers: int = 3,
+        max_retries: int = 3
+    ):
+        self.maxsize = maxsize
+        self.per_chat_interval = per_chat_interval
+        self.worker_count = workers
+        self.max_retries = max_retries
+        self.global_limiter = TokenBucket(global_rate, global_rate)
+        self._chat_limiters: Dict[int, TokenBucket] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self.bot: Optional[Bot] = None
+
+    def start(self, bot: Bot):
+        self.bot = bot
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.worker_count)]
+
+    def full(self) -> bool:
+        """True when new messages would be dropped; check before paying for a completion"""
+        return self._queue is None or self._queue.full()
+
+    def put(self, chat_id: int, text: str) -> bool:
+        if self.full():
+            logger.warning(f"Outbound queue full, dropping message for {chat_id}")
+            return False
+        self._queue.put_nowait(OutboundMessage(chat_id, text))
+        return True
+
+    def _chat_limiter(self, chat_id: int) -> TokenBucket:
+        limiter = self._chat_limiters.get(chat_id)
+        if limiter is None:
+            limiter = self._chat_limiters[chat_id] = TokenBucket(1 / self.per_chat_interval, 1)
+        return limiter
+
+    async def _worker(self):
+        while True:
+            message = await self._queue.get()
+            try:
+                await self._send(message)
+            except Exception as e:
+                logger.error(f"Unexpected error sending to {message.chat_id}: {e}", exc_info=True)
+            finally:
+                self._queue.task_done()
+
+    async def _send(self, message: OutboundMessage):
+        await self._chat_limiter(message.chat_id).acquire()
+        await self.global_limiter.acquire()
+
+        try:
+            await self.bot.send_message(chat_id=message.chat_id, text=message.text)
+            return
+        except RetryAfter as e:
+            retry_after = retry_after_seconds(e)
+            logger.warning(f"Flood control hit, pausing outbound messages for {retry_after}s")
+            self.global_limiter.pause(retry_after)
+        except (Forbidden, BadRequest) as e:
+            # Blocked by the user or invalid chat; retrying won't help
+            logger.error(f"Dropping message for {message.chat_id}: {e}")
+            return
+        except NetworkError as e:
+            logger.warning(f"Network error sending to {message.chat_id}: {e}")
+
+        message.attempts += 1
+        if message.attempts > self.max_retries:
+            logger.error(f"Giving up on message for {message.chat_id} after {message.attempts} attempts")
+        elif not self._queue.full():
+            self._queue.put_nowait(message)
+        else:
+            logger.warning(f"Outbound queue full, dropping retry for {message.chat_id}")
+
+    async def close(self, timeout: float = 5.0):
+        """Give queued messages a moment to go out, then stop the workers"""
+        if self._queue is not None and self._workers:
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Shutting down with {self._queue.qsize()} outbound messages unsent")
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
\ No newline at end of file
@@ -1,19 +1,89 @@
-from telegram import Update
+from telegram import Message, Update
+from telegram.constants import MessageLimit
+from telegram.error import BadRequest, RetryAfter
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
 from config.config import config
-from src.llm.openrouter import OpenRouterClient
+from src.integrations.google_context import GoogleContext, create_google_context
+from src.llm.cache import ResponseCache
+from src.llm.context import ContextBuilder, supports_prompt_caching
+from src.llm.openrouter import ChatCompletion, OpenRouterClient, OpenRouterError, cached_prompt_tokens
 from src.memory.conversation import ConversationMemory
-from src.tasks.task_manager import TaskManager
+from src.memory.store import create_store
+from src.memory.summarizer import ConversationSummarizer
+from src.tasks.task_manager import Task, TaskManager
 from src.tasks.scheduler import MessageScheduler
-from src.utils.helpers import authorized_only
+from src.tasks.reminders import ReminderEngine
+from src.bot.outbox import OutboundQueue
+from src.bot.turns import TurnQueue
+from src.utils.helpers import authorized_only, retry_after_seconds
+from dataclasses import dataclass
+from typing import Dict, Hashable, List, Optional
+import asyncio
 import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class ProactiveDraft:
+    completion: ChatCompletion
+    state: Hashable  # conversation state the draft was generated from
+    created_at: float
 
 class KurisuBot:
     def __init__(self):
-        self.llm = OpenRouterClient()
-        self.memory = ConversationMemory()
-        self.task_manager = TaskManager()
-        self.scheduler = MessageScheduler()
+        response_cache = None
+        if config.RESPONSE_CACHE_ENABLED:
+            response_cache = ResponseCache(
+                max_entries=config.RESPONSE_CACHE_MAX_ENTRIES,
+                ttl=config.RESPONSE_CACHE_TTL,
+                path=config.DATABASE_PATH if config.RESPONSE_CACHE_DISK else None
+            )
+        self.llm = OpenRouterClient(response_cache=response_cache)
+        self.memory = ConversationMemory(
+            max_messages=config.MAX_HISTORY_LENGTH,
+            store=create_store(config.CONVERSATION_STORE, config.DATABASE_PATH)
+        )
+        self.summarizer = ConversationSummarizer(
+            self.llm,
+            self.memory.store,
+            batch_size=config.SUMMARY_BATCH_SIZE,
+            model=config.SUMMARY_MODEL,
+            max_tokens=config.SUMMARY_MAX_TOKENS
+        )
+        self.summarizer.attach(self.memory)
+        self.context_builder = ContextBuilder(
+            config.PROMPT_TOKEN_BUDGET,
+            cache_control=supports_prompt_caching(self.llm.model)
+        )
+        self.task_manager = TaskManager(db_path=config.DATABASE_PATH)
+        self.reminders = ReminderEngine(
+            self.task_manager,
+            self.send_task_reminder,
+            lead_time=config.REMINDER_LEAD_TIME
+        )
+        self.application: Optional[Application] = None
+        self.scheduler = MessageScheduler(
+            db_path=config.DATABASE_PATH,
+            lookahead=config.PROACTIVE_PREGENERATE_LOOKAHEAD
+        )
+        # Pending or finished pre-generated proactive messages per user
+        self._drafts: Dict[int, asyncio.Task] = {}
+        self._draft_slots = asyncio.Semaphore(config.PROACTIVE_PREGENERATE_CONCURRENCY)
+        self.scheduler.stop_listeners.append(self._discard_draft)
+        self.google: Optional[GoogleContext] = create_google_context() if config.GOOGLE_CONTEXT_ENABLED else None
+        self.turns = TurnQueue(
+            self._handle_turn,
+            debounce=config.MESSAGE_DEBOUNCE_SECONDS,
+            max_wait=config.MESSAGE_DEBOUNCE_MAX_WAIT
+        )
+        self.outbox = OutboundQueue(
+            maxsize=config.OUTBOX_MAX_SIZE,
+            global_rate=config.OUTBOX_GLOBAL_RATE,
+            per_chat_interval=config.OUTBOX_PER_CHAT_INTERVAL,
+            workers=config.OUTBOX_WORKERS,
+            max_retries=config.OUTBOX_MAX_RETRIES
+        )
         
         # Initialize the system prompt
         self.system_prompt = """You are Kurisu Makise, a brilliant 18-year-old neuroscience researcher from the anime Steins;Gate. 
@@ -24,11 +94,70 @@ class KurisuBot:
         3. Show concern for the user's progress while maintaining your tsundere attitude
         4. Reference scientific concepts when appropriate
         Don't explicitly state you're an AI - stay in character as Kurisu."""
+
+    async def _load_conversation(self, user_id: int):
+        await self.memory.ensure_loaded(user_id)
+        await self.summarizer.ensure_loaded(user_id, self.memory)
+        await self.task_manager.load_tasks(user_id)
+
+    def _system_sections(self, user_id: int) -> list:
+        # Ordered from most to least stable so providers can reuse the cached prompt prefix
+        sections = [self.system_prompt]
+
+        tasks = self.task_manager.get_tasks(user_id)
+        if tasks:
+            sections.append("Current user tasks:\n" + "\n".join(
+                f"- {task.title}" for task in tasks
+            ))
+
+        summary = self.summarizer.get_summary(user_id)
+        if summary:
+            sections.append(f"Summary of your earlier conversation with the user:\n{summary}")
+
+        # Served from cache; refreshed in the background so turns never wait on Google
+        if self.google is not None:
+            google_section = self.google.context_section()
+            if google_section:
+                sections.append(google_section)
+        return sections
+
+    async def post_init(self, application: Application):
+        """Start background work that needs the running application"""
+        self.application = application
+        self.outbox.start(application.bot)
+        if self.google is not None:
+            await self.google.start()
+        await self.reminders.start()
+        await self.scheduler.start(self.send_proactive_message, self.prepare_proactive_message)
+
+    async def stop(self):
+        """Stop background work while the Telegram bot can still send"""
+        await self.scheduler.stop()
+        for draft in self._drafts.values():
+            draft.cancel()
+        await asyncio.gather(*self._drafts.values(), return_exceptions=True)
+        self._drafts.clear()
+        await self.reminders.close()
+        if self.google is not None:
+            await self.google.close()
+        await self.turns.close()
+        await self.summarizer.close()
+        # Last, so reminders and proactive messages queued above still go out
+        await self.outbox.close()
+
+    async def shutdown(self):
+        """Release resources held for the bot's lifetime"""
+        await self.scheduler.close()
+        await self.memory.close()
+        await self.task_manager.close()
+        await self.llm.aclose()
+        if self.llm.response_cache is not None:
+            await self.llm.response_cache.close()
     
     @authorized_only()
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         user_id = update.effective_user.id
-        self.task_manager.load_tasks(user_id)
+        await self.task_manager.load_tasks(user_id)
         self.scheduler.start_scheduling(user_id, self.send_proactive_message)
         
         await update.message.reply_text(
@@ -38,51 +167,212 @@ class KurisuBot:
     
     @authorized_only()
     async def handle_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        user_id = update.effective_user.id
-        user_message = update.message.text
+        # Turns run one at a time per user; quick follow-ups are merged into the next turn
+        self.turns.submit(update.effective_user.id, update)
+
+    async def _handle_turn(self, user_id: int, updates: list):
+        user_message = "\n".join(update.message.text for update in updates)
+        # Reply to the latest message of the batch
+        update = updates[-1]
+
+        await self._load_conversation(user_id)
         
         # Add user message to memory
         self.memory.add_message(user_id, "user", user_message)
         
-        # Prepare conversation history
-        messages = [{"role": "system", "content": self.system_prompt}]
-        
-        # Add task context
-        tasks = self.task_manager.get_tasks(user_id)
-        if tasks:
-            task_context = "Current user tasks:\n" + "\n".join(
-                f"- {task.title}" for task in tasks
-            )
-            messages.append({"role": "system", "content": task_context})
-        
-        # Add conversation history
-        messages.extend([
-            {"role": msg["role"], "content": msg["content"]}
-            for msg in self.memory.get_conversation_history(user_id)
-        ])
+        # Fit persona, task context and as much recent history as the token budget allows
+        messages = self.context_builder.build(
+            self._system_sections(user_id),
+            self.memory.get_conversation_history(user_id)
+        )
         
         # Generate response
-        response = await self.llm.generate_response(messages)
+        if config.STREAM_RESPONSES:
+            completion = await self._stream_reply(update.message, messages)
+        else:
+            try:
+                completion = await self.llm.create_chat_completion(messages)
+            except OpenRouterError as e:
+                logger.error(f"Failed to generate reply for {user_id}: {e}")
+                await update.message.reply_text(e.user_message)
+                return
+            await update.message.reply_text(completion.content)
+
+        self._log_completion(user_id, completion)
+        if completion.failed:
+            # The user saw the error text, but it isn't part of the conversation
+            return
         
         # Add assistant response to memory
-        self.memory.add_message(user_id, "assistant", response)
-        
-        await update.message.reply_text(response)
+        self.memory.add_message(user_id, "assistant", completion.content)
+
+    def _log_completion(self, user_id: int, completion: ChatCompletion):
+        if not completion.id:
+            return
+        usage = completion.usage
+        logger.info(
+            f"Completion {completion.id} for {user_id} ({completion.model}): "
+            f"{usage.get('prompt_tokens', '?')} prompt ({cached_prompt_tokens(usage)} cached) / "
+            f"{usage.get('completion_tokens', '?')} completion tokens, "
+            f"cache hit ratio {self.llm.cache_stats.hit_ratio:.0%}"
+        )
+
+    async def _stream_reply(self, message: Message, messages: list) -> ChatCompletion:
+        """Send a placeholder and progressively edit it as the completion streams in.
+
+        Edits are coalesced to at most one per STREAM_EDIT_INTERVAL so we stay
+        under Telegram's edit rate limits; the first chunk is shown immediately.
+        """
+        limit = MessageLimit.MAX_TEXT_LENGTH
+        reply = await message.reply_text(config.STREAM_PLACEHOLDER)
+        shown = config.STREAM_PLACEHOLDER
+        text = ""
+        next_edit = 0.0
+
+        stream = self.llm.stream_response(messages)
+        async for chunk in stream:
+            text += chunk
+            now = time.monotonic()
+            if now < next_edit or not text.strip() or text[:limit] == shown:
+                continue
+
+            shown, delay = await self._edit_reply(reply, text[:limit], shown)
+            next_edit = now + max(config.STREAM_EDIT_INTERVAL, delay)
+
+        if not text.strip():
+            text = stream.completion.content = "..."
+
+        # Flush whatever was coalesced after the last edit
+        if text[:limit] != shown:
+            for _ in range(3):
+                shown, delay = await self._edit_reply(reply, text[:limit], shown)
+                if not delay:
+                    break
+                await asyncio.sleep(delay)
+
+        # Telegram caps message length, so send any overflow as follow-ups
+        for start in range(limit, len(text), limit):
+            await message.reply_text(text[start:start + limit])
+
+        return stream.completion
+
+    @staticmethod
+    async def _edit_reply(reply: Message, text: str, shown: str):
+        """Edit the streamed reply; returns the text now shown and any flood-wait delay"""
+        try:
+            await reply.edit_text(text)
+            return text, 0.0
+        except RetryAfter as e:
+            retry_after = retry_after_seconds(e)
+            logger.warning(f"Edit rate limited, backing off for {retry_after}s")
+            return shown, retry_after
+        except BadRequest as e:
+            # Raised when the content did not change; nothing to do
+            if "not modified" not in str(e).lower():
+                logger.error(f"Failed to edit streamed reply: {e}")
+            return text, 0.0
     
+    def _conversation_state(self, user_id: int) -> Hashable:
+        """Cheap fingerprint of everything a proactive message is generated from"""
+        history = self.memory.get_conversation_history(user_id)
+        return (
+            len(history),
+            history[-1].timestamp if history else None,
+            tuple((task.id, task.title) for task in self.task_manager.get_tasks(user_id)),
+            self.summarizer.get_summary(user_id),
+            self.google.context_section() if self.google is not None else None
+        )
+
+    async def _generate_proactive(self, user_id: int) -> Optional[ChatCompletion]:
+        messages = self.context_builder.build(
+            self._system_sections(user_id),
+            self.memory.get_conversation_history(user_id),
+            trailing=["Generate a proactive message to check on the user's progress."]
+        )
+        try:
+            return await self.llm.create_chat_completion(messages)
+        except OpenRouterError as e:
+            # Unlike replies, there's nobody waiting on this one; just try again next time
+            logger.error(f"Failed to generate proactive message for {user_id}: {e}")
+            return None
+
+    async def prepare_proactive_message(self, user_id: int, fire_at: float):
+        """Pre-generate the next proactive message so sending it is instant"""
+        draft = self._drafts.get(user_id)
+        if draft is not None and not draft.done():
+            return
+        self._drafts[user_id] = asyncio.create_task(self._draft_proactive_message(user_id, fire_at))
+
+    def _discard_draft(self, user_id: int):
+        """Cancel and forget a user's pending draft, e.g. when their messages are paused"""
+        draft = self._drafts.pop(user_id, None)
+        if draft is not None:
+            draft.cancel()
+
+    async def _draft_proactive_message(self, user_id: int, fire_at: float) -> Optional[ProactiveDraft]:
+        # Let live conversations have the model first, but don't hold up the fire time.
+        # Waiting happens before taking a slot so other drafts aren't blocked meanwhile.
+        try:
+            await asyncio.wait_for(self.turns.wait_idle(), timeout=max(0.0, fire_at - time.time()))
+        except asyncio.TimeoutError:
+            pass
+
+        async with self._draft_slots:
+            await self._load_conversation(user_id)
+            state = self._conversation_state(user_id)
+            completion = await self._generate_proactive(user_id)
+            if completion is None:
+                return None
+            return ProactiveDraft(completion, state, time.time())
+
+    async def _take_draft(self, user_id: int) -> Optional[ChatCompletion]:
+        task = self._drafts.pop(user_id, None)
+        if task is None:
+            return None
+        try:
+            draft = await task
+        except Exception as e:
+            logger.error(f"Pre-generating proactive message for {user_id} failed: {e}")
+            return None
+        if draft is None:
+            return None
+
+        max_age = config.PROACTIVE_PREGENERATE_LOOKAHEAD + config.MISFIRE_GRACE_TIME
+        if time.time() - draft.created_at > max_age:
+            logger.debug(f"Discarding expired proactive draft for {user_id}")
+            return None
+        if self._conversation_state(user_id) != draft.state:
+            logger.debug(f"Discarding stale proactive draft for {user_id}")
+            return None
+        return draft.completion
+
     async def send_proactive_message(self, user_id: int):
-        """Send a proactive message to the user"""
-        messages = [
-            {"role": "system", "content": self.system_prompt},
-            {"role": "system", "content": "Generate a proactive message to check on the user's progress."}
-        ]
-        
-        tasks = self.task_manager.get_tasks(user_id)
-        if tasks:
-            task_context = "Current user tasks:\n" + "\n".join(
-                f"- {task.title}" for task in tasks
-            )
-            messages.append({"role": "system", "content": task_context})
-        
-        response = await self.llm.generate_response(messages)
-        # Note: You'll need to implement the actual message sending using context.bot.send_message
-        # This will be connected in the main.py file 
\ No newline at end of file
+        """Queue a proactive message, using the pre-generated one if it's still current"""
+        # Don't pay for a completion that would be dropped anyway
+        if self.outbox.full():
+            logger.warning(f"Outbound queue full, skipping proactive message for {user_id}")
+            self._discard_draft(user_id)
+            return
+
+        await self._load_conversation(user_id)
+        completion = await self._take_draft(user_id)
+        if completion is None:
+            completion = await self._generate_proactive(user_id)
+            if completion is None:
+                return
+
+        if self.outbox.put(user_id, completion.content):
+            self._log_completion(user_id, completion)
+            # Keep it in the history so the user's reply has context
+            self.memory.add_message(user_id, "assistant", completion.content)
+
+    async def send_task_reminder(self, user_id: int, tasks: List[Task]) -> bool:
+        """Remind the user about tasks that are about to be (or already are) due; False if it couldn't be queued"""
+        lines = "\n".join(
+            f"- {task.title} (due {task.due_date.strftime('%Y-%m-%d %H:%M')})" for task in tasks
+        )
+        return self.outbox.put(
+            user_id,
+            f"Hey! These are due soon:\n{lines}\n"
+            "D-don't get the wrong idea, I just don't want to watch you miss another deadline."
+        )
\ No newline at end of file
@@ -0,0 +1,77 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List
+from telegram import Update
+
+logger = logging.getLogger(__name__)
+
+TurnHandler = Callable[[int, List[Update]], Awaitable[None]]
+
+class TurnQueue:
+    """Serialises conversation turns per user and coalesces bursts of messages.
+
+    Each user gets at most one worker task. Messages that arrive while a turn
+    is waiting out the debounce window, or while the LLM is still answering,
+    are handed to the next turn as a single batch.
+    """
+
+    def __init__(self, handler: TurnHandler, debounce: float = 0.0, max_wait: float = 5.0):
+        self.handler = handler
+        self.debounce = debounce
+        self.max_wait = max_wait
+        self._pending: Dict[int, List[Update]] = {}
+        self._workers: Dict[int, asyncio.Task] = {}
+        # Set while no turn is queued or in progress
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    def submit(self, user_id: int, update: Update):
+        self._pending.setdefault(user_id, []).append(update)
+
+        worker = self._workers.get(user_id)
+        if worker is None or worker.done():
+            self._workers[user_id] = asyncio.create_task(self._run(user_id))
+            self._idle.clear()
+
+    async def wait_idle(self):
+        """Return once no user has a turn queued or in progress"""
+        await self._idle.wait()
+
+    async def _wait_for_quiet(self, user_id: int):
+        # Restart the window whenever another message lands, up to max_wait
+        deadline = time.monotonic() + self.max_wait
+        seen = -1
+        while len(self._pending[user_id]) != seen and time.monotonic() < deadline:
+            seen = len(self._pending[user_id])
+            await asyncio.sleep(min(self.debounce, max(0.0, deadline - time.monotonic())))
+
+    async def _run(self, user_id: int):
+        try:
+            while self._pending.get(user_id):
+                if self.debounce > 0:
+                    await self._wait_for_quiet(user_id)
+
+                batch = self._pending.pop(user_id)
+                if len(batch) > 1:
+                    logger.debug(f"Coalesced {len(batch)} messages from {user_id} into one turn")
+
+                try:
+                    await self.handler(user_id, batch)
+                except Exception as e:
+                    logger.error(f"Error handling turn for {user_id}: {e}", exc_info=True)
+        finally:
+            if self._workers.get(user_id) is asyncio.current_task():
+                del self._workers[user_id]
+            if not self._workers:
+                self._idle.set()
+
+    async def close(self):
+        """Cancel in-flight turns and drop anything still queued"""
+        workers = list(self._workers.values())
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        self._workers.clear()
+        self._pending.clear()
+        self._idle.set()
\ No newline at end of file
@@ -0,0 +1,53 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Dict, List, Optional
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+logger = logging.getLogger(__name__)
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """Processes updates from different chats concurrently, one at a time per chat.
+
+    Updates wait for their chat's lock before taking one of `workers` slots,
+    so a chat with a backlog doesn't tie up the pool while it waits its turn.
+    The base class semaphore only caps how many updates may be held at once.
+    """
+
+    def __init__(self, workers: int, max_pending: int = 256):
+        super().__init__(max(workers, max_pending))
+        self.workers = workers
+        self._slots = asyncio.Semaphore(workers)
+        # chat_id -> [lock, number of updates holding or waiting for it]
+        self._chat_locks: Dict[int, List[Any]] = {}
+
+    @staticmethod
+    def _chat_id(update: object) -> Optional[int]:
+        if isinstance(update, Update) and update.effective_chat is not None:
+            return update.effective_chat.id
+        return None
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]):
+        chat_id = self._chat_id(update)
+        if chat_id is None:
+            async with self._slots:
+                await coroutine
+            return
+
+        entry = self._chat_locks.setdefault(chat_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            # asyncio.Lock wakes waiters in FIFO order, which keeps the chat's updates in order
+            async with entry[0]:
+                async with self._slots:
+                    await coroutine
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._chat_locks[chat_id]
+
+    async def initialize(self):
+        logger.info(f"Processing updates with {self.workers} workers, ordered per chat")
+
+    async def shutdown(self):
+        pass
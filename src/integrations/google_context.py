@@ -0,0 +1,133 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+from config.config import config
+
+logger = logging.getLogger(__name__)
+
+# Seconds to wait before retrying a source whose refresh failed
+RETRY_DELAY = 60
+
+@dataclass
+class CachedSource:
+    fetch: Callable[[], Any]  # blocking; runs in a worker thread
+    ttl: float
+    value: Any = None
+    fetched_at: Optional[float] = None
+    next_refresh: float = 0.0
+    refreshing: Optional[asyncio.Task] = None
+
+class GoogleContext:
+    """Serves calendar, sleep and Google Tasks data from a per-source TTL cache.
+
+    The Google client libraries block, so fetches run in a worker thread. A
+    background loop refreshes each source shortly before it expires, and chat
+    turns only read what is already cached, so they never wait on Google. A failed fetch
+    keeps the previous value and is retried after RETRY_DELAY.
+    """
+
+    def __init__(self, auth, ttls: Dict[str, float], refresh_ahead: float = 0.1):
+        self.refresh_ahead = refresh_ahead
+        self.sources: Dict[str, CachedSource] = {
+            "calendar": CachedSource(auth.get_calendar_events, ttls["calendar"]),
+            "sleep": CachedSource(auth.get_sleep_data, ttls["sleep"]),
+            "tasks": CachedSource(auth.get_tasks, ttls["tasks"])
+        }
+        self._loop_task: Optional[asyncio.Task] = None
+
+    def peek(self, name: str) -> Optional[Any]:
+        """Cached value without waiting; a stale value is kept for up to another TTL while refreshing"""
+        source = self.sources[name]
+        if source.fetched_at is None or time.monotonic() - source.fetched_at > 2 * source.ttl:
+            return None
+        return source.value
+
+    async def get(self, name: str) -> Any:
+        """Cached value if fresh, otherwise wait for a refresh"""
+        source = self.sources[name]
+        if source.fetched_at is not None and time.monotonic() - source.fetched_at <= source.ttl:
+            return source.value
+        return await self.refresh(name)
+
+    async def refresh(self, name: str) -> Any:
+        # Concurrent callers share a single in-flight fetch
+        source = self.sources[name]
+        if source.refreshing is None or source.refreshing.done():
+            source.refreshing = asyncio.create_task(self._fetch(name))
+        return await asyncio.shield(source.refreshing)
+
+    async def _fetch(self, name: str) -> Any:
+        source = self.sources[name]
+        started = time.monotonic()
+        try:
+            value = await asyncio.to_thread(source.fetch)
+        except Exception as e:
+            logger.error(f"Failed to refresh Google {name}: {e}")
+            source.next_refresh = time.monotonic() + RETRY_DELAY
+            return self.peek(name)
+
+        source.value = value
+        source.fetched_at = time.monotonic()
+        source.next_refresh = source.fetched_at + source.ttl * (1 - self.refresh_ahead)
+        logger.debug(f"Refreshed Google {name} in {source.fetched_at - started:.2f}s")
+        return value
+
+    async def start(self):
+        """Start refreshing every source in the background; the first fetch happens right away"""
+        self._loop_task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            now = time.monotonic()
+            due = [name for name, source in self.sources.items() if source.next_refresh <= now]
+            if due:
+                await asyncio.gather(*(self.refresh(name) for name in due))
+                continue
+
+            delay = min(source.next_refresh for source in self.sources.values()) - now
+            await asyncio.sleep(delay)
+
+    def context_section(self) -> Optional[str]:
+        """Prompt section built from whatever is cached right now"""
+        lines: List[str] = []
+
+        calendar = self.peek("calendar")
+        if calendar:
+            lines.append(calendar)
+
+        sleep = self.peek("sleep")
+        if sleep:
+            hours = sum(segment["duration"] for segment in sleep)
+            lines.append(f"Sleep in the last 24 hours: {hours:.1f} hours")
+
+        tasks = self.peek("tasks")
+        if tasks:
+            lines.append(tasks)
+
+        if not lines:
+            return None
+        return "The user's day, from their Google account:\n" + "\n".join(lines)
+
+    async def close(self):
+        tasks = [source.refreshing for source in self.sources.values() if source.refreshing is not None]
+        if self._loop_task is not None:
+            tasks.append(self._loop_task)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._loop_task = None
+
+def create_google_context() -> GoogleContext:
+    # Imported here so the Google client libraries are only needed when the integration is enabled
+    from personal_google_auth import PersonalGoogleAuth
+
+    return GoogleContext(
+        PersonalGoogleAuth(),
+        ttls={
+            "calendar": config.GOOGLE_CALENDAR_TTL,
+            "sleep": config.GOOGLE_SLEEP_TTL,
+            "tasks": config.GOOGLE_TASKS_TTL
+        }
+    )
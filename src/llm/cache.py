@@ -0,0 +1,94 @@
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from src.utils.sqlite import SQLiteWriter
+
+logger = logging.getLogger(__name__)
+
+class ResponseCache:
+    """Content-addressed cache for completions of deterministic requests.
+
+    Entries live in an in-process LRU with a TTL, backed by an optional SQLite
+    tier so results survive restarts. Memory hits never touch the event loop.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS response_cache (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_response_cache_expires_at ON response_cache (expires_at);
+    """
+
+    def __init__(self, max_entries: int = 256, ttl: float = 86400, path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+        self.db: Optional[SQLiteWriter] = None
+        if path:
+            self.db = SQLiteWriter(path, self.SCHEMA)
+            self.db.execute("DELETE FROM response_cache WHERE expires_at <= ?", (time.time(),))
+
+    @staticmethod
+    def make_key(namespace: str, request: Dict[str, Any]) -> str:
+        # Transport-only options don't change the completion
+        material = {k: v for k, v in request.items() if k not in ("stream", "usage")}
+        encoded = json.dumps([namespace, material], sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+        return hashlib.sha256(encoded.encode()).hexdigest()
+
+    def _remember(self, key: str, expires_at: float, value: Dict[str, Any]):
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get_memory(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        value = self.get_memory(key)
+        if value is None and self.db is not None:
+            rows = await self.db.query_async(
+                "SELECT value, expires_at FROM response_cache WHERE key = ? AND expires_at > ?",
+                (key, time.time())
+            )
+            if rows:
+                value = json.loads(rows[0]["value"])
+                self._remember(key, rows[0]["expires_at"], value)
+
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def put(self, key: str, value: Dict[str, Any]):
+        expires_at = time.time() + self.ttl
+        self._remember(key, expires_at, value)
+        if self.db is not None:
+            self.db.execute(
+                "INSERT OR REPLACE INTO response_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), expires_at)
+            )
+
+    async def close(self):
+        if self.db is not None:
+            try:
+                await self.db.flush()
+            finally:
+                await self.db.close()
\ No newline at end of file
@@ -0,0 +1,107 @@
+import logging
+from typing import Dict, List, Sequence
+from config.config import config
+from src.memory.conversation import Message
+
+logger = logging.getLogger(__name__)
+
+# Rough per-message cost of role markers and separators in chat formats
+MESSAGE_OVERHEAD = 4
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception:
+    _encoding = None
+
+def estimate_tokens(text: str) -> int:
+    """Token count for budgeting; exact with tiktoken, ~4 chars/token otherwise"""
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
+
+def message_tokens(message: Message) -> int:
+    if message.tokens is None:
+        message.tokens = estimate_tokens(message.content) + MESSAGE_OVERHEAD
+    return message.tokens
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    if max_tokens <= 0:
+        return ""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    if _encoding is not None:
+        return _encoding.decode(_encoding.encode(text, disallowed_special=())[:max_tokens])
+    return text[:max_tokens * 4]
+
+def supports_prompt_caching(model: str) -> bool:
+    """Whether `model` needs explicit cache_control breakpoints to cache prompts"""
+    prefixes = [p.strip() for p in config.PROMPT_CACHE_MODEL_PREFIXES.split(",") if p.strip()]
+    return any(model.startswith(prefix) for prefix in prefixes)
+
+def with_cache_control(message: Dict) -> Dict:
+    """Copy of `message` marked as the end of a cacheable prompt prefix"""
+    return {
+        "role": message["role"],
+        "content": [{"type": "text", "text": message["content"], "cache_control": {"type": "ephemeral"}}]
+    }
+
+class ContextBuilder:
+    """Fits system sections and conversation history into a prompt token budget.
+
+    Pinned system sections are kept in order; history is filled newest-first
+    and the oldest turns are dropped once the budget runs out. The latest
+    message is always kept so the model has something to answer.
+
+    With `cache_control`, breakpoints are placed after the persona prompt,
+    after the last pinned section and on the latest history message, so
+    providers that cache explicitly can reuse each of those prefixes.
+    """
+
+    def __init__(self, budget: int, cache_control: bool = False):
+        self.budget = budget
+        self.cache_control = cache_control
+
+    def build(
+        self,
+        system: Sequence[str],
+        history: Sequence[Message],
+        trailing: Sequence[str] = ()
+    ) -> List[Dict]:
+        pinned = [[content, estimate_tokens(content) + MESSAGE_OVERHEAD] for content in system]
+        tail = [[content, estimate_tokens(content) + MESSAGE_OVERHEAD] for content in trailing]
+        remaining = self.budget - sum(cost for _, cost in pinned + tail)
+
+        # Keep room for at least the newest message by trimming the most specific
+        # pinned section (e.g. the task list), never the persona prompt itself
+        newest_cost = message_tokens(history[-1]) if history else 0
+        if remaining < newest_cost and len(pinned) > 1:
+            section = pinned[-1]
+            trimmed = truncate_to_tokens(section[0], section[1] - (newest_cost - remaining) - MESSAGE_OVERHEAD)
+            trimmed_cost = estimate_tokens(trimmed) + MESSAGE_OVERHEAD if trimmed else 0
+            remaining += section[1] - trimmed_cost
+            section[:] = [trimmed, trimmed_cost]
+
+        selected = []
+        for message in reversed(history):
+            cost = message_tokens(message)
+            if selected and cost > remaining:
+                break
+            selected.append(message)
+            remaining -= cost
+
+        if len(selected) < len(history):
+            logger.debug(f"Dropped {len(history) - len(selected)} old messages to fit {self.budget} token budget")
+
+        messages = [{"role": "system", "content": content} for content, _ in pinned if content]
+        pinned_count = len(messages)
+        messages.extend(message.payload for message in reversed(selected))
+        history_end = len(messages)
+        messages.extend({"role": "system", "content": content} for content, _ in tail if content)
+
+        if self.cache_control:
+            # Anthropic allows at most four breakpoints per request
+            for index in sorted({0, pinned_count - 1, history_end - 1}):
+                if 0 <= index < history_end:
+                    messages[index] = with_cache_control(messages[index])
+        return messages
\ No newline at end of file
@@ -1,50 +1,401 @@
+import asyncio
 import httpx
-from typing import List, Dict
+import json
+import random
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, AsyncIterator, List, Dict, Optional
 from config.config import config
+from src.llm.cache import ResponseCache
+from src.utils.rate_limit import TokenBucket
 import logging
 
 logger = logging.getLogger(__name__)
 
+TIMEOUT_REPLY = "I apologize, but I'm having trouble thinking right now. Could you try again in a moment?"
+HTTP_ERROR_REPLY = "Sorry, I encountered an error while processing your message. Please try again later."
+UNEXPECTED_ERROR_REPLY = "An unexpected error occurred. Please try again later."
+
+# 526 is Cloudflare's "invalid SSL certificate", which OpenRouter returns transiently
+RETRYABLE_STATUSES = {408, 429, 500, 502, 503, 504, 526}
+
+class OpenRouterError(Exception):
+    def __init__(self, message: str, status: Optional[int] = None, user_message: str = HTTP_ERROR_REPLY):
+        super().__init__(message)
+        self.status = status
+        # In-character text the bot can send instead of the completion
+        self.user_message = user_message
+
+@dataclass
+class ChatCompletion:
+    id: str = ""
+    model: str = ""
+    content: str = ""
+    finish_reason: Optional[str] = None
+    usage: Dict[str, Any] = field(default_factory=dict)
+    # True when served from the response cache instead of the API
+    cached: bool = False
+    # True when a stream failed; content is then error text or a partial reply and shouldn't be kept
+    failed: bool = False
+
+@dataclass
+class PromptCacheStats:
+    """Running totals of prompt tokens served from the provider's prompt cache"""
+    requests: int = 0
+    prompt_tokens: int = 0
+    cached_tokens: int = 0
+
+    def record(self, usage: Dict[str, Any]):
+        if not usage:
+            return
+        self.requests += 1
+        self.prompt_tokens += usage.get("prompt_tokens") or 0
+        self.cached_tokens += cached_prompt_tokens(usage)
+
+    @property
+    def hit_ratio(self) -> float:
+        return self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+
+def cached_prompt_tokens(usage: Dict[str, Any]) -> int:
+    details = usage.get("prompt_tokens_details") or {}
+    return details.get("cached_tokens") or 0
+
+class CompletionStream:
+    """Async iterator over content deltas; `completion` is filled in as the stream is consumed"""
+
+    def __init__(self, chunks: AsyncIterator[str], completion: ChatCompletion):
+        self._chunks = chunks
+        self.completion = completion
+
+    def __aiter__(self) -> AsyncIterator[str]:
+        return self._chunks
+
+    @property
+    def failed(self) -> bool:
+        return self.completion.failed
+
 class OpenRouterClient:
-    def __init__(self):
-        self.api_key = config.OPENROUTER_API_KEY
-        self.model = config.OPENROUTER_MODEL
-        self.base_url = "https://openrouter.ai/api/v1"
-        
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        base_url: str = "https://openrouter.ai/api/v1",
+        model: Optional[str] = None,
+        response_cache: Optional[ResponseCache] = None
+    ):
+        self.api_key = api_key or config.OPENROUTER_API_KEY
+        self.model = model or config.OPENROUTER_MODEL
+        self.base_url = base_url.rstrip('/')
+
         if not self.api_key:
             raise ValueError("OPENROUTER_API_KEY is not set in environment variables")
-        
+
+        self.headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "HTTP-Referer": "https://github.com/your-username/kurisu-bot",
+            "Content-Type": "application/json"
+        }
+        self._client: Optional[httpx.AsyncClient] = None
+        self.rate_limiter = TokenBucket(config.OPENROUTER_RATE_LIMIT, config.OPENROUTER_RATE_BURST)
+        self.cache_stats = PromptCacheStats()
+        self.response_cache = response_cache
+
+    def _create_client(self) -> httpx.AsyncClient:
+        limits = httpx.Limits(
+            max_connections=config.OPENROUTER_MAX_CONNECTIONS,
+            max_keepalive_connections=config.OPENROUTER_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=config.OPENROUTER_KEEPALIVE_EXPIRY
+        )
+        http2 = config.OPENROUTER_HTTP2
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                logger.warning("h2 is not installed, falling back to HTTP/1.1 for OpenRouter")
+                http2 = False
+
+        return httpx.AsyncClient(
+            base_url=self.base_url,
+            headers=self.headers,
+            timeout=config.OPENROUTER_TIMEOUT,
+            limits=limits,
+            http2=http2
+        )
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Shared connection pool, created lazily and kept alive for the bot's lifetime"""
+        if self._client is None or self._client.is_closed:
+            self._client = self._create_client()
+        return self._client
+
+    async def aclose(self):
+        """Close the connection pool. Called from the Application shutdown hook."""
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+
+    @staticmethod
+    def _backoff_delay(attempt: int) -> float:
+        # Full jitter: spreads retries out so concurrent callers don't stampede together
+        ceiling = min(config.OPENROUTER_BACKOFF_MAX, config.OPENROUTER_BACKOFF_BASE * (2 ** attempt))
+        return random.uniform(0, ceiling)
+
+    @staticmethod
+    def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            retry_at = parsedate_to_datetime(value)
+            return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+        except (TypeError, ValueError):
+            return None
+
+    async def _send(self, data: Dict) -> httpx.Response:
+        """POST a completion request, retrying transient failures.
+
+        The response is opened in streaming mode; callers must read or close it.
+        429s pause the shared rate limiter for Retry-After seconds, so every
+        in-flight caller waits once rather than each sleeping independently.
+        """
+        max_retries = config.OPENROUTER_MAX_RETRIES
+
+        for attempt in range(max_retries + 1):
+            await self.rate_limiter.acquire()
+            final_attempt = attempt == max_retries
+
+            try:
+                request = self.client.build_request("POST", "/chat/completions", json=data)
+                response = await self.client.send(request, stream=True)
+            except httpx.TimeoutException as e:
+                if final_attempt:
+                    raise OpenRouterError("Request to OpenRouter timed out", user_message=TIMEOUT_REPLY) from e
+                delay = self._backoff_delay(attempt)
+                logger.warning(f"OpenRouter request timed out, retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                continue
+            except httpx.TransportError as e:
+                if final_attempt:
+                    raise OpenRouterError(f"Transport error: {e}") from e
+                delay = self._backoff_delay(attempt)
+                logger.warning(f"OpenRouter transport error ({e}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                continue
+
+            if response.status_code < 400:
+                return response
+
+            body = (await response.aread()).decode(errors="replace")
+            await response.aclose()
+            status = response.status_code
+
+            if status not in RETRYABLE_STATUSES or final_attempt:
+                raise OpenRouterError(f"OpenRouter returned {status}: {body[:200]}", status=status)
+
+            if status == 429:
+                retry_after = self._parse_retry_after(response.headers.get("Retry-After"))
+                if retry_after is None:
+                    retry_after = self._backoff_delay(attempt)
+                logger.warning(f"Rate limited by OpenRouter, pausing requests for {retry_after:.1f}s")
+                self.rate_limiter.pause(retry_after)
+            else:
+                delay = self._backoff_delay(attempt)
+                logger.warning(f"OpenRouter returned {status}, retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+        raise OpenRouterError("Exhausted retries")
+
+    def _build_payload(self, messages: List[Dict], model: Optional[str], temperature: float, params: Dict) -> Dict:
+        data = {
+            "model": model or self.model,
+            "messages": messages,
+            "temperature": temperature,
+            # Have OpenRouter report detailed usage, including cached prompt tokens
+            "usage": {"include": True}
+        }
+        data.update(params)
+        return data
+
+    def _cache_key(self, data: Dict, cacheable: bool) -> Optional[str]:
+        if not cacheable or self.response_cache is None:
+            return None
+        return ResponseCache.make_key(self.base_url, data)
+
+    async def _cached_completion(self, cache_key: Optional[str]) -> Optional[ChatCompletion]:
+        if cache_key is None:
+            return None
+        value = await self.response_cache.get(cache_key)
+        return ChatCompletion(**value, cached=True) if value is not None else None
+
+    def _store_completion(self, cache_key: Optional[str], completion: ChatCompletion):
+        if cache_key is not None and completion.content:
+            value = asdict(completion)
+            del value["cached"], value["failed"]
+            self.response_cache.put(cache_key, value)
+
+    async def create_chat_completion(
+        self,
+        messages: List[Dict],
+        model: Optional[str] = None,
+        temperature: float = 0.7,
+        cacheable: bool = False,
+        **params
+    ) -> ChatCompletion:
+        """Run a completion and return the full result (id, usage, ...). Raises OpenRouterError.
+
+        `cacheable` requests are looked up in (and saved to) the response cache;
+        only use it where identical inputs should give the identical answer.
+        """
+        data = self._build_payload(messages, model, temperature, params)
+        cache_key = self._cache_key(data, cacheable)
+        cached = await self._cached_completion(cache_key)
+        if cached is not None:
+            return cached
+
+        try:
+            response = await self._send(data)
+            try:
+                await response.aread()
+            finally:
+                await response.aclose()
+            result = response.json()
+        except OpenRouterError:
+            raise
+        except (httpx.HTTPError, json.JSONDecodeError) as e:
+            raise OpenRouterError(f"Failed to read OpenRouter response: {e}") from e
+
+        # OpenRouter can report provider errors in a 200 body
+        if "error" in result:
+            error = result["error"]
+            raise OpenRouterError(
+                f"API error {error.get('code', 'unknown')}: {error.get('message', 'Unknown error')}",
+                status=error.get("code") if isinstance(error.get("code"), int) else None
+            )
+
+        try:
+            choice = result["choices"][0]
+            content = choice["message"]["content"] or ""
+        except (KeyError, IndexError, TypeError) as e:
+            raise OpenRouterError(f"Malformed completion response: {str(result)[:200]}") from e
+
+        usage = result.get("usage") or {}
+        self.cache_stats.record(usage)
+
+        completion = ChatCompletion(
+            id=result.get("id", ""),
+            model=result.get("model", data["model"]),
+            content=content,
+            finish_reason=choice.get("finish_reason"),
+            usage=usage
+        )
+        self._store_completion(cache_key, completion)
+        return completion
+
     async def generate_response(self, messages: List[Dict], temperature: float = 0.7) -> str:
         try:
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "HTTP-Referer": "https://github.com/your-username/kurisu-bot",
-                "Content-Type": "application/json"
-            }
-            
-            data = {
-                "model": self.model,
-                "messages": messages,
-                "temperature": temperature
-            }
-            
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(
-                    f"{self.base_url}/chat/completions",
-                    headers=headers,
-                    json=data
-                )
-                response.raise_for_status()
-                return response.json()["choices"][0]["message"]["content"]
-                
+            completion = await self.create_chat_completion(messages, temperature=temperature)
+            return completion.content
+
+        except OpenRouterError as e:
+            logger.error(f"OpenRouter request failed: {e}")
+            return e.user_message
+
+        except Exception as e:
+            logger.error(f"Unexpected error in generate_response: {e}", exc_info=True)
+            return UNEXPECTED_ERROR_REPLY
+
+    def stream_response(
+        self,
+        messages: List[Dict],
+        model: Optional[str] = None,
+        temperature: float = 0.7,
+        cacheable: bool = False,
+        **params
+    ) -> CompletionStream:
+        """Stream content deltas over SSE (stream: true).
+
+        Failures before the first token yield the in-character error text, so
+        callers can always render whatever the stream produces; `failed` tells
+        them not to keep it as the assistant's reply.
+        """
+        data = self._build_payload(messages, model, temperature, params)
+        data["stream"] = True
+        completion = ChatCompletion(model=data["model"])
+        cache_key = self._cache_key(data, cacheable)
+        return CompletionStream(self._iter_stream(data, completion, cache_key), completion)
+
+    async def _iter_stream(self, data: Dict, completion: ChatCompletion, cache_key: Optional[str]) -> AsyncIterator[str]:
+        cached = await self._cached_completion(cache_key)
+        if cached is not None:
+            completion.__dict__.update(cached.__dict__)
+            yield cached.content
+            return
+
+        received = False
+
+        try:
+            response = await self._send(data)
+            try:
+                async for line in response.aiter_lines():
+                    # SSE frames look like "data: {...}"; lines starting with ":" are keep-alive comments
+                    if not line.startswith("data:"):
+                        continue
+                    payload = line[len("data:"):].strip()
+                    if payload == "[DONE]":
+                        break
+
+                    chunk = json.loads(payload)
+                    if "error" in chunk:
+                        raise OpenRouterError(chunk["error"].get("message", "Unknown streaming error"))
+
+                    completion.id = chunk.get("id", completion.id)
+                    completion.model = chunk.get("model", completion.model)
+                    if chunk.get("usage"):
+                        completion.usage = chunk["usage"]
+                        self.cache_stats.record(completion.usage)
+                    if not chunk.get("choices"):
+                        continue
+
+                    choice = chunk["choices"][0]
+                    completion.finish_reason = choice.get("finish_reason") or completion.finish_reason
+                    content = choice.get("delta", {}).get("content")
+                    if content:
+                        received = True
+                        completion.content += content
+                        yield content
+            finally:
+                await response.aclose()
+
+            self._store_completion(cache_key, completion)
+
+        except OpenRouterError as e:
+            logger.error(f"OpenRouter streaming request failed: {e}")
+            completion.failed = True
+            if not received:
+                completion.content = e.user_message
+                yield e.user_message
+
         except httpx.TimeoutException:
-            logger.error("Request to OpenRouter timed out")
-            return "I apologize, but I'm having trouble thinking right now. Could you try again in a moment?"
-            
+            logger.error("Streaming request to OpenRouter timed out")
+            completion.failed = True
+            if not received:
+                completion.content = TIMEOUT_REPLY
+                yield TIMEOUT_REPLY
+
         except httpx.HTTPError as e:
-            logger.error(f"HTTP error occurred: {e}")
-            return "Sorry, I encountered an error while processing your message. Please try again later."
-            
+            logger.error(f"HTTP error occurred while streaming: {e}")
+            completion.failed = True
+            if not received:
+                completion.content = HTTP_ERROR_REPLY
+                yield HTTP_ERROR_REPLY
+
         except Exception as e:
-            logger.error(f"Unexpected error in generate_response: {e}", exc_info=True)
-            return "An unexpected error occurred. Please try again later." 
\ No newline at end of file
+            logger.error(f"Unexpected error in stream_response: {e}", exc_info=True)
+            completion.failed = True
+            if not received:
+                completion.content = UNEXPECTED_ERROR_REPLY
+                yield UNEXPECTED_ERROR_REPLY
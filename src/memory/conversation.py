@@ -1,29 +1,84 @@
-from typing import List, Dict, Optional
-from datetime import datetime
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Set
+import time
+from src.memory.store import ConversationStore, InMemoryStore
+
+class Message:
+    __slots__ = ("role", "content", "timestamp", "payload", "tokens")
+
+    def __init__(self, role: str, content: str, timestamp: float):
+        self.role = role
+        self.content = content
+        self.timestamp = timestamp  # epoch seconds
+        # Built once so prompts can reference it on every turn without re-allocating.
+        # Shared between turns: copy it before modifying.
+        self.payload = {"role": role, "content": content}
+        # Prompt token estimate, filled in lazily by the context builder
+        self.tokens: Optional[int] = None
 
 class ConversationMemory:
-    def __init__(self, max_messages: int = 30):
+    def __init__(self, max_messages: int = 30, store: Optional[ConversationStore] = None):
         self.max_messages = max_messages
-        self.conversations: Dict[int, List[Dict]] = {}
+        self.store = store or InMemoryStore()
+        self.conversations: Dict[int, Deque[Message]] = {}
+        self._loaded: Set[int] = set()
+        # Called with (user_id, message) for each message pushed out of the window
+        self.eviction_listeners: List[Callable[[int, Message], None]] = []
+        # Called with (user_id, timestamp) when a user's conversation is reset
+        self.reset_listeners: List[Callable[[int, float], None]] = []
+
+    def _history(self, user_id: int) -> Deque[Message]:
+        history = self.conversations.get(user_id)
+        if history is None:
+            # maxlen makes append evict the oldest message in O(1)
+            history = self.conversations[user_id] = deque(maxlen=self.max_messages)
+        return history
+
+    async def ensure_loaded(self, user_id: int):
+        """Lazily pull the tail of a user's history from the store on first use"""
+        if user_id in self._loaded:
+            return
+
+        stored = await self.store.load_tail(user_id, self.max_messages)
+        if user_id in self._loaded:
+            return
+        self._loaded.add(user_id)
+
+        # Messages added before the load finished are already in memory (and maybe in `stored`)
+        history = self._history(user_id)
+        if history:
+            first_timestamp = history[0].timestamp
+            stored = [m for m in stored if m[2] < first_timestamp]
+
+        # Prepend newest-first so the in-memory messages stay at the end
+        for role, content, timestamp in reversed(stored):
+            if len(history) == self.max_messages:
+                break
+            history.appendleft(Message(role, content, timestamp))
     
     def add_message(self, user_id: int, role: str, content: str):
-        if user_id not in self.conversations:
-            self.conversations[user_id] = []
-            
-        message = {
-            "role": role,
-            "content": content,
-            "timestamp": datetime.now().isoformat()
-        }
-        
-        self.conversations[user_id].append(message)
-        
-        # Keep only the last max_messages
-        if len(self.conversations[user_id]) > self.max_messages:
-            self.conversations[user_id] = self.conversations[user_id][-self.max_messages:]
-    
-    def get_conversation_history(self, user_id: int) -> List[Dict]:
-        return self.conversations.get(user_id, [])
+        message = Message(role, content, time.time())
+        history = self._history(user_id)
+        if history and len(history) == history.maxlen:
+            for listener in self.eviction_listeners:
+                listener(user_id, history[0])
+        history.append(message)
+        self.store.append(user_id, role, content, message.timestamp)
     
+    def get_conversation_history(self, user_id: int) -> Deque[Message]:
+        """Live view of the user's window; don't mutate it"""
+        return self.conversations.get(user_id, deque())
+
     def clear_history(self, user_id: int):
-        self.conversations[user_id] = [] 
\ No newline at end of file
+        cleared_at = time.time()
+        self._history(user_id).clear()
+        self._loaded.add(user_id)
+        self.store.reset(user_id, cleared_at)
+        for listener in self.reset_listeners:
+            listener(user_id, cleared_at)
+
+    async def close(self):
+        try:
+            await self.store.flush()
+        finally:
+            await self.store.close()
@@ -0,0 +1,159 @@
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Tuple
+from src.utils.sqlite import SQLiteWriter
+
+# (role, content, timestamp) with timestamp in epoch seconds
+StoredMessage = Tuple[str, str, float]
+
+class ConversationStore(ABC):
+    """Append-only log of conversation messages, shared by every ConversationMemory"""
+
+    @abstractmethod
+    def append(self, user_id: int, role: str, content: str, timestamp: float):
+        ...
+
+    @abstractmethod
+    async def load_tail(self, user_id: int, limit: int) -> List[StoredMessage]:
+        """Return the newest `limit` messages since the last reset, oldest first"""
+
+    @abstractmethod
+    async def load_range(self, user_id: int, after: float, before: float, limit: int) -> List[StoredMessage]:
+        """Return up to `limit` of the oldest messages with after < timestamp < before"""
+
+    @abstractmethod
+    def reset(self, user_id: int, timestamp: float):
+        """Hide everything before `timestamp` from future loads without deleting it"""
+
+    @abstractmethod
+    def save_summary(self, user_id: int, summary: str, covered_until: float):
+        """Store the running summary of all messages up to `covered_until`"""
+
+    @abstractmethod
+    async def load_summary(self, user_id: int) -> Optional[Tuple[str, float]]:
+        ...
+
+    async def flush(self):
+        pass
+
+    async def close(self):
+        pass
+
+class InMemoryStore(ConversationStore):
+    """Process-local store, mainly for tests and throwaway runs"""
+
+    def __init__(self):
+        self.messages: Dict[int, List[StoredMessage]] = {}
+        self.resets: Dict[int, float] = {}
+        self.summaries: Dict[int, Tuple[str, float]] = {}
+
+    def append(self, user_id: int, role: str, content: str, timestamp: float):
+        self.messages.setdefault(user_id, []).append((role, content, timestamp))
+
+    async def load_tail(self, user_id: int, limit: int) -> List[StoredMessage]:
+        cleared_at = self.resets.get(user_id, 0.0)
+        messages = [m for m in self.messages.get(user_id, []) if m[2] > cleared_at]
+        return messages[-limit:] if limit > 0 else []
+
+    async def load_range(self, user_id: int, after: float, before: float, limit: int) -> List[StoredMessage]:
+        after = max(after, self.resets.get(user_id, 0.0))
+        return [m for m in self.messages.get(user_id, []) if after < m[2] < before][:limit]
+
+    def reset(self, user_id: int, timestamp: float):
+        self.resets[user_id] = timestamp
+        self.summaries.pop(user_id, None)
+
+    def save_summary(self, user_id: int, summary: str, covered_until: float):
+        self.summaries[user_id] = (summary, covered_until)
+
+    async def load_summary(self, user_id: int) -> Optional[Tuple[str, float]]:
+        return self.summaries.get(user_id)
+
+class SQLiteStore(ConversationStore):
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            role TEXT NOT NULL,
+            content TEXT NOT NULL,
+            timestamp REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_messages_user_timestamp ON messages (user_id, timestamp);
+        CREATE TABLE IF NOT EXISTS conversation_resets (
+            user_id INTEGER PRIMARY KEY,
+            cleared_at REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS conversation_summaries (
+            user_id INTEGER PRIMARY KEY,
+            summary TEXT NOT NULL,
+            covered_until REAL NOT NULL
+        );
+    """
+
+    def __init__(self, path: str, batch_size: int = 100, flush_interval: float = 0.5):
+        self.db = SQLiteWriter(path, self.SCHEMA, batch_size=batch_size, flush_interval=flush_interval)
+
+    def append(self, user_id: int, role: str, content: str, timestamp: float):
+        self.db.execute(
+            "INSERT INTO messages (user_id, role, content, timestamp) VALUES (?, ?, ?, ?)",
+            (user_id, role, content, timestamp)
+        )
+
+    async def load_tail(self, user_id: int, limit: int) -> List[StoredMessage]:
+        rows = await self.db.query_async(
+            """
+            SELECT role, content, timestamp FROM messages
+            WHERE user_id = ?
+              AND timestamp > COALESCE((SELECT cleared_at FROM conversation_resets WHERE user_id = ?), 0)
+            ORDER BY timestamp DESC, id DESC
+            LIMIT ?
+            """,
+            (user_id, user_id, limit)
+        )
+        return [(row["role"], row["content"], row["timestamp"]) for row in reversed(rows)]
+
+    async def load_range(self, user_id: int, after: float, before: float, limit: int) -> List[StoredMessage]:
+        rows = await self.db.query_async(
+            """
+            SELECT role, content, timestamp FROM messages
+            WHERE user_id = ?
+              AND timestamp > MAX(?, COALESCE((SELECT cleared_at FROM conversation_resets WHERE user_id = ?), 0))
+              AND timestamp < ?
+            ORDER BY timestamp, id
+            LIMIT ?
+            """,
+            (user_id, after, user_id, before, limit)
+        )
+        return [(row["role"], row["content"], row["timestamp"]) for row in rows]
+
+    def reset(self, user_id: int, timestamp: float):
+        self.db.execute(
+            "INSERT OR REPLACE INTO conversation_resets (user_id, cleared_at) VALUES (?, ?)",
+            (user_id, timestamp)
+        )
+        self.db.execute("DELETE FROM conversation_summaries WHERE user_id = ?", (user_id,))
+
+    def save_summary(self, user_id: int, summary: str, covered_until: float):
+        self.db.execute(
+            "INSERT OR REPLACE INTO conversation_summaries (user_id, summary, covered_until) VALUES (?, ?, ?)",
+            (user_id, summary, covered_until)
+        )
+
+    async def load_summary(self, user_id: int) -> Optional[Tuple[str, float]]:
+        rows = await self.db.query_async(
+            "SELECT summary, covered_until FROM conversation_summaries WHERE user_id = ?",
+            (user_id,)
+        )
+        return (rows[0]["summary"], rows[0]["covered_until"]) if rows else None
+
+    async def flush(self):
+        await self.db.flush()
+
+    async def close(self):
+        await self.db.close()
+
+def create_store(backend: str, path: str) -> ConversationStore:
+    if backend == "memory":
+        return InMemoryStore()
+    if backend == "sqlite":
+        return SQLiteStore(path)
+    raise ValueError(f"Unknown conversation store backend: {backend}")
\ No newline at end of file
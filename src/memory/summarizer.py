@@ -0,0 +1,157 @@
+import asyncio
+import logging
+from typing import Dict, List, Optional, Set
+from src.llm.openrouter import OpenRouterClient, OpenRouterError
+from src.memory.conversation import ConversationMemory, Message
+from src.memory.store import ConversationStore
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_INSTRUCTIONS = (
+    "You maintain a running summary of a conversation between the user and Kurisu. "
+    "Merge the new messages into the existing summary. Keep facts about the user, "
+    "their goals, commitments and anything Kurisu promised to follow up on. "
+    "Write in the third person, be concise, and respond with the updated summary only."
+)
+
+class ConversationSummarizer:
+    """Folds messages evicted from the history window into a per-user running summary.
+
+    Evicted messages are batched and summarised in a background task, one LLM
+    call per `batch_size` messages, so the reply path never waits on it.
+    """
+
+    def __init__(
+        self,
+        llm: OpenRouterClient,
+        store: ConversationStore,
+        batch_size: int = 10,
+        model: Optional[str] = None,
+        max_tokens: int = 300
+    ):
+        self.llm = llm
+        self.store = store
+        self.batch_size = batch_size
+        self.model = model
+        self.max_tokens = max_tokens
+        self.summaries: Dict[int, str] = {}
+        self._covered_until: Dict[int, float] = {}
+        self._pending: Dict[int, List[Message]] = {}
+        self._workers: Dict[int, asyncio.Task] = {}
+        self._loaded: Set[int] = set()
+
+    def attach(self, memory: ConversationMemory):
+        memory.eviction_listeners.append(self.on_evict)
+        memory.reset_listeners.append(self.on_reset)
+
+    def get_summary(self, user_id: int) -> Optional[str]:
+        return self.summaries.get(user_id)
+
+    async def ensure_loaded(self, user_id: int, memory: ConversationMemory):
+        """Load the stored summary and queue anything evicted but never summarised.
+
+        Call after memory.ensure_loaded so the window's oldest message is known.
+        """
+        if user_id in self._loaded:
+            return
+        self._loaded.add(user_id)
+
+        stored = await self.store.load_summary(user_id)
+        if stored:
+            self.summaries[user_id], self._covered_until[user_id] = stored
+
+        history = memory.get_conversation_history(user_id)
+        if len(history) < memory.max_messages:
+            return
+
+        # Messages that fell out of the window before the last restart, read in pages until caught up
+        pending: List[Message] = []
+        after = self._covered_until.get(user_id, 0.0)
+        page_size = self.batch_size * 4
+        while True:
+            page = await self.store.load_range(user_id, after, history[0].timestamp, page_size)
+            pending.extend(Message(role, content, timestamp) for role, content, timestamp in page)
+            if len(page) < page_size:
+                break
+            after = page[-1][2]
+
+        if pending:
+            logger.info(f"Queued {len(pending)} unsummarised messages for {user_id}")
+        self._pending[user_id] = pending + self._pending.get(user_id, [])
+        self._maybe_start(user_id)
+
+    def on_evict(self, user_id: int, message: Message):
+        if message.timestamp <= self._covered_until.get(user_id, 0.0):
+            return
+        self._pending.setdefault(user_id, []).append(message)
+        self._maybe_start(user_id)
+
+    def on_reset(self, user_id: int, cleared_at: float):
+        """Forget the summary along with the conversation; the store drops its copy on reset"""
+        self.summaries.pop(user_id, None)
+        self._pending.pop(user_id, None)
+        # Anything evicted from before the reset must not be summarised again
+        self._covered_until[user_id] = cleared_at
+        worker = self._workers.pop(user_id, None)
+        if worker is not None:
+            worker.cancel()
+
+    def _maybe_start(self, user_id: int):
+        if len(self._pending.get(user_id, [])) < self.batch_size:
+            return
+        worker = self._workers.get(user_id)
+        if worker is None or worker.done():
+            self._workers[user_id] = asyncio.create_task(self._run(user_id))
+
+    async def _run(self, user_id: int):
+        try:
+            while len(self._pending.get(user_id, [])) >= self.batch_size:
+                batch = self._pending[user_id][:self.batch_size]
+                if not await self._fold(user_id, batch):
+                    # Keep the batch queued; the next eviction retries
+                    return
+                del self._pending[user_id][:len(batch)]
+        finally:
+            if self._workers.get(user_id) is asyncio.current_task():
+                del self._workers[user_id]
+
+    async def _fold(self, user_id: int, batch: List[Message]) -> bool:
+        transcript = "\n".join(f"{message.role}: {message.content}" for message in batch)
+        messages = [
+            {"role": "system", "content": SUMMARY_INSTRUCTIONS},
+            {"role": "user", "content": (
+                f"Existing summary:\n{self.summaries.get(user_id) or '(none)'}\n\n"
+                f"New messages:\n{transcript}"
+            )}
+        ]
+
+        try:
+            completion = await self.llm.create_chat_completion(
+                messages,
+                model=self.model,
+                temperature=0,
+                max_tokens=self.max_tokens,
+                # Re-folding the same backlog after a restart gives the same summary
+                cacheable=True
+            )
+        except OpenRouterError as e:
+            logger.warning(f"Failed to summarise history for {user_id}: {e}")
+            return False
+
+        summary = completion.content.strip()
+        if not summary:
+            return False
+
+        covered_until = batch[-1].timestamp
+        self.summaries[user_id] = summary
+        self._covered_until[user_id] = covered_until
+        self.store.save_summary(user_id, summary, covered_until)
+        logger.debug(f"Folded {len(batch)} messages into summary for {user_id}")
+        return True
+
+    async def close(self):
+        workers = list(self._workers.values())
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        self._workers.clear()
\ No newline at end of file
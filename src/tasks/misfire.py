@@ -0,0 +1,21 @@
+import random
+
+# What to do with jobs whose fire time passed while the bot was down
+SKIP = "skip"          # drop the missed run and carry on with the normal schedule
+RUN_ONCE = "run_once"  # run each missed job once
+COALESCE = "coalesce"  # fold all of a user's missed jobs into a single run
+
+POLICIES = (SKIP, RUN_ONCE, COALESCE)
+
+def validate_policy(policy: str) -> str:
+    if policy not in POLICIES:
+        raise ValueError(f"Unknown misfire policy {policy!r}, expected one of {', '.join(POLICIES)}")
+    return policy
+
+def is_misfire(fire_at: float, now: float, grace_time: float) -> bool:
+    """Whether a job is too late to run as if nothing happened"""
+    return now - fire_at > grace_time
+
+def catch_up_time(now: float, spread: float) -> float:
+    """Randomised catch-up time, so a restart doesn't release every missed job at once"""
+    return now + random.uniform(0, spread)
\ No newline at end of file
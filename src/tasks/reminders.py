@@ -0,0 +1,129 @@
+import logging
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+from config.config import config
+from src.tasks import misfire
+from src.tasks.task_manager import Task, TaskManager
+from src.tasks.timers import TimerHeap
+
+logger = logging.getLogger(__name__)
+
+# Receives every task of one user that fell due at the same moment; returns whether the reminder was queued
+ReminderCallback = Callable[[int, List[Task]], Awaitable[bool]]
+
+# Seconds to wait before retrying reminders that couldn't be queued
+RETRY_DELAY = 60
+
+class ReminderEngine:
+    """Fires due-date reminders for every user's tasks from a single asyncio task.
+
+    Pending reminders sit in a TimerHeap keyed on fire time. Completed,
+    rescheduled or already-reminded tasks are discarded lazily when they come
+    due, so nothing has to be removed eagerly. Reminders for one user that
+    come due together are delivered as one. A task is only marked reminded
+    once delivery has been accepted; otherwise its reminder is re-armed.
+    """
+
+    def __init__(
+        self,
+        task_manager: TaskManager,
+        callback: ReminderCallback,
+        lead_time: float = 0,
+        misfire_policy: Optional[str] = None
+    ):
+        self.task_manager = task_manager
+        self.callback = callback
+        self.lead_time = lead_time
+        self.misfire_policy = misfire.validate_policy(misfire_policy or config.MISFIRE_POLICY)
+        # Payloads are (user_id, task_id, due_timestamp); a user's reminders due together pop as one batch
+        self._timers = TimerHeap("Reminder delivery", self._fire, batch_key=lambda payload: payload[0])
+        # Task ids whose reminder is being delivered right now
+        self._delivering: Set[str] = set()
+        task_manager.task_listeners.append(self.on_task_added)
+
+    async def start(self):
+        """Rebuild the heap from storage and start the reminder loop"""
+        now = time.time()
+        catch_up_at: Dict[int, float] = {}
+        missed = 0
+
+        for user_id, task_id, due_timestamp in await self.task_manager.store.load_pending_reminders():
+            if not misfire.is_misfire(due_timestamp - self.lead_time, now, config.MISFIRE_GRACE_TIME):
+                self._push(user_id, task_id, due_timestamp)
+                continue
+
+            missed += 1
+            if self.misfire_policy == misfire.SKIP:
+                self.task_manager.store.mark_reminded(task_id, datetime.now())
+            elif self.misfire_policy == misfire.COALESCE:
+                # Same fire time for all of a user's missed reminders, so they pop together
+                if user_id not in catch_up_at:
+                    catch_up_at[user_id] = misfire.catch_up_time(now, config.MISFIRE_SPREAD)
+                self._push(user_id, task_id, due_timestamp, fire_at=catch_up_at[user_id])
+            else:
+                self._push(user_id, task_id, due_timestamp, fire_at=misfire.catch_up_time(now, config.MISFIRE_SPREAD))
+
+        logger.info(
+            f"Loaded {len(self._timers)} pending task reminders "
+            f"({missed} missed, policy {self.misfire_policy})"
+        )
+        self._timers.start()
+
+    def on_task_added(self, user_id: int, task: Task):
+        if task.due_date is not None and not task.completed:
+            self._push(user_id, task.id, task.due_date.timestamp())
+
+    def _push(self, user_id: int, task_id: str, due_timestamp: float, fire_at: Optional[float] = None):
+        if fire_at is None:
+            fire_at = due_timestamp - self.lead_time
+        self._timers.push(fire_at, (user_id, task_id, due_timestamp))
+
+    async def _fire(self, fire_at: float, due: List[Tuple[int, str, float]]):
+        user_id = due[0][0]
+        await self.task_manager.load_tasks(user_id)
+
+        pending = []
+        for _, task_id, due_timestamp in due:
+            task = self.task_manager.get_task(user_id, task_id)
+            # Stale heap entry: task gone, done, already reminded or its due date changed
+            if (
+                task is None or task.completed or task.reminded_at is not None
+                or task.due_date is None or task.due_date.timestamp() != due_timestamp
+                or task_id in self._delivering
+            ):
+                continue
+            pending.append((task, due_timestamp))
+
+        if not pending:
+            return
+
+        # Deliver in the background so a slow send can't hold up later reminders
+        self._delivering.update(task.id for task, _ in pending)
+        self._timers.track(self._deliver(user_id, pending))
+
+    async def _deliver(self, user_id: int, pending: List[Tuple[Task, float]]):
+        try:
+            delivered = await self.callback(user_id, [task for task, _ in pending])
+        except Exception as e:
+            logger.error(f"Reminder delivery for {user_id} failed: {e}", exc_info=True)
+            delivered = False
+        finally:
+            self._delivering.difference_update(task.id for task, _ in pending)
+
+        if delivered:
+            for task, _ in pending:
+                self.task_manager.mark_reminded(user_id, task.id)
+            return
+
+        # Re-armed with the old due date, so a reschedule in the meantime still makes it stale
+        logger.warning(f"Reminders for {user_id} weren't queued, retrying in {RETRY_DELAY}s")
+        retry_at = time.time() + RETRY_DELAY
+        for task, due_timestamp in pending:
+            self._push(user_id, task.id, due_timestamp, fire_at=retry_at)
+
+    def __len__(self) -> int:
+        return len(self._timers)
+
+    async def close(self):
+        await self._timers.close()
@@ -1,44 +1,168 @@
-import asyncio
+import logging
 import random
-from datetime import datetime, time
-from typing import Callable, Dict, Optional
+import time as clock
+from datetime import datetime, time, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+import pytz
 from config.config import config
+from src.tasks import misfire
+from src.tasks.timers import TimerHeap
+from src.utils.sqlite import SQLiteWriter
+
+logger = logging.getLogger(__name__)
+
+ProactiveCallback = Callable[[int], Awaitable[None]]
+# Called with (user_id, fire_at) ahead of a fire time so the message can be prepared early
+PrepareCallback = Callable[[int, float], Awaitable[None]]
+
+def _parse_time(value: str) -> time:
+    hour, minute = value.split(":")
+    return time(int(hour), int(minute))
 
 class MessageScheduler:
-    def __init__(self):
-        self.scheduled_tasks: Dict[int, asyncio.Task] = {}
-        
-    async def schedule_messages(
+    """Drives proactive messages for all users from one loop.
+
+    Each user has a single next-fire time, kept in a TimerHeap; entries that no
+    longer match it are stale and skipped. Fire times and paused state are persisted so restarts
+    resume timers instead of resetting them; runs missed while the bot was
+    down are handled according to the misfire policy. With a lookahead, a
+    second entry per fire triggers the prepare callback that long before it.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS scheduler_jobs (
+            user_id INTEGER PRIMARY KEY,
+            next_fire REAL NOT NULL,
+            start_time TEXT NOT NULL,
+            end_time TEXT NOT NULL,
+            paused INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE INDEX IF NOT EXISTS idx_scheduler_jobs_next_fire ON scheduler_jobs (next_fire);
+    """
+
+    def __init__(
         self,
-        user_id: int,
-        callback: Callable,
-        start_time: Optional[time] = time(9, 0),  # 9 AM
-        end_time: Optional[time] = time(22, 0)    # 10 PM
+        db_path: Optional[str] = None,
+        misfire_policy: Optional[str] = None,
+        lookahead: float = 0
     ):
-        """Schedule random messages for a user within the specified time window"""
-        while True:
-            now = datetime.now().time()
-            
-            # Only send messages during active hours
-            if start_time <= now <= end_time:
-                # Random delay between min and max interval
-                delay = random.randint(
-                    config.PROACTIVE_MESSAGE_MIN_INTERVAL,
-                    config.PROACTIVE_MESSAGE_MAX_INTERVAL
-                )
-                
-                await asyncio.sleep(delay)
-                await callback(user_id)
+        self.db = SQLiteWriter(db_path or config.DATABASE_PATH, self.SCHEMA)
+        self._migrate()
+        self.misfire_policy = misfire.validate_policy(misfire_policy or config.MISFIRE_POLICY)
+        self.timezone = pytz.timezone(config.TIMEZONE)
+        self.default_start = _parse_time(config.ACTIVE_HOURS_START)
+        self.default_end = _parse_time(config.ACTIVE_HOURS_END)
+        self.lookahead = lookahead
+
+        self.next_fire: Dict[int, float] = {}
+        self.windows: Dict[int, Tuple[time, time]] = {}
+        self.callbacks: Dict[int, ProactiveCallback] = {}
+        self.paused: Set[int] = set()
+        self.default_callback: Optional[ProactiveCallback] = None
+        self.prepare_callback: Optional[PrepareCallback] = None
+        # Called with the user id when their messages are paused or stopped
+        self.stop_listeners: List[Callable[[int], None]] = []
+        # Payloads are (user_id, fire_at, prepare); an entry is stale once fire_at isn't the user's next fire
+        self._timers = TimerHeap(
+            "Proactive message",
+            self._on_due,
+            is_stale=lambda _, payload: self.next_fire.get(payload[0]) != payload[1]
+        )
+
+    def _migrate(self):
+        # Databases created before pausing was persisted lack the paused column
+        columns = {row["name"] for row in self.db.query("PRAGMA table_info(scheduler_jobs)")}
+        if "paused" not in columns:
+            self.db.execute("ALTER TABLE scheduler_jobs ADD COLUMN paused INTEGER NOT NULL DEFAULT 0")
+            self.db.flush_sync()
+
+    def _in_window(self, moment: datetime, start_time: time, end_time: time) -> bool:
+        now = moment.time()
+        if start_time <= end_time:
+            return start_time <= now <= end_time
+        # Window wraps past midnight, e.g. 20:00-02:00
+        return now >= start_time or now <= end_time
+
+    def _next_window_start(self, moment: datetime, start_time: time) -> datetime:
+        day = moment.date()
+        candidate = self.timezone.localize(datetime.combine(day, start_time))
+        if candidate <= moment:
+            candidate = self.timezone.localize(datetime.combine(day + timedelta(days=1), start_time))
+        return candidate
+
+    def compute_next_fire(self, user_id: int, now: Optional[float] = None) -> float:
+        """Random interval from now, pushed to the next active window if it lands outside one"""
+        start_time, end_time = self.windows.get(user_id, (self.default_start, self.default_end))
+        now = now if now is not None else clock.time()
+        delay = random.randint(config.PROACTIVE_MESSAGE_MIN_INTERVAL, config.PROACTIVE_MESSAGE_MAX_INTERVAL)
+
+        candidate = datetime.fromtimestamp(now + delay, self.timezone)
+        if self._in_window(candidate, start_time, end_time):
+            return candidate.timestamp()
+
+        # Spread users out a little after the window opens instead of all firing at once
+        window_start = self._next_window_start(candidate, start_time)
+        jitter = random.uniform(0, config.PROACTIVE_MESSAGE_MIN_INTERVAL)
+        return window_start.timestamp() + jitter
+
+    def _persist(self, user_id: int):
+        start_time, end_time = self.windows.get(user_id, (self.default_start, self.default_end))
+        self.db.execute(
+            """
+            INSERT OR REPLACE INTO scheduler_jobs (user_id, next_fire, start_time, end_time, paused)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            (
+                user_id, self.next_fire.get(user_id, 0.0),
+                start_time.strftime("%H:%M"), end_time.strftime("%H:%M"), int(user_id in self.paused)
+            )
+        )
+
+    def _push(self, user_id: int, fire_at: float):
+        self.next_fire[user_id] = fire_at
+        self._timers.push(fire_at, (user_id, fire_at, False))
+        if self.prepare_callback is not None and self.lookahead > 0:
+            self._timers.push(fire_at - self.lookahead, (user_id, fire_at, True))
+
+    def _set_next_fire(self, user_id: int, fire_at: float):
+        self._push(user_id, fire_at)
+        self._persist(user_id)
+
+    async def start(self, callback: ProactiveCallback, prepare: Optional[PrepareCallback] = None):
+        """Restore persisted jobs and start the scheduler loop"""
+        self.default_callback = callback
+        self.prepare_callback = prepare
+
+        rows = await self.db.query_async(
+            "SELECT user_id, next_fire, start_time, end_time, paused FROM scheduler_jobs"
+        )
+        now = clock.time()
+        missed = 0
+        for row in rows:
+            user_id = row["user_id"]
+            self.windows[user_id] = (_parse_time(row["start_time"]), _parse_time(row["end_time"]))
+            if row["paused"]:
+                self.paused.add(user_id)
+                continue
+
+            fire_at = row["next_fire"]
+            if misfire.is_misfire(fire_at, now, config.MISFIRE_GRACE_TIME):
+                missed += 1
+                # A user has at most one pending proactive message, so run_once and coalesce agree
+                if self.misfire_policy == misfire.SKIP:
+                    self._set_next_fire(user_id, self.compute_next_fire(user_id, now))
+                else:
+                    self._set_next_fire(user_id, misfire.catch_up_time(now, config.MISFIRE_SPREAD))
             else:
-                # Wait until start_time of next day
-                tomorrow = datetime.now().replace(
-                    hour=start_time.hour,
-                    minute=start_time.minute,
-                    second=0
-                )
-                wait_seconds = (tomorrow - datetime.now()).seconds
-                await asyncio.sleep(wait_seconds)
-    
+                self._push(user_id, fire_at)
+
+        logger.info(
+            f"Restored proactive schedules for {len(rows)} users "
+            f"({len(self.paused)} paused, {missed} missed, policy {self.misfire_policy})"
+        )
+
+        self._timers.start()
+
     def start_scheduling(
         self,
         user_id: int,
@@ -46,17 +170,57 @@ class MessageScheduler:
         start_time: Optional[time] = None,
         end_time: Optional[time] = None
     ):
-        """Start scheduling messages for a user"""
-        if user_id in self.scheduled_tasks:
-            self.scheduled_tasks[user_id].cancel()
-        
-        task = asyncio.create_task(
-            self.schedule_messages(user_id, callback, start_time, end_time)
-        )
-        self.scheduled_tasks[user_id] = task
-    
+        """Start or resume scheduling messages for a user, keeping an already pending fire time"""
+        self.callbacks[user_id] = callback
+        window = (start_time or self.default_start, end_time or self.default_end)
+        window_changed = self.windows.get(user_id) != window
+        self.windows[user_id] = window
+        self.paused.discard(user_id)
+
+        if user_id not in self.next_fire or window_changed:
+            self._set_next_fire(user_id, self.compute_next_fire(user_id))
+
+    def pause_scheduling(self, user_id: int):
+        """Pause a user's messages; the paused state survives restarts"""
+        self.paused.add(user_id)
+        self.next_fire.pop(user_id, None)
+        self._persist(user_id)
+        self._notify_stopped(user_id)
+
     def stop_scheduling(self, user_id: int):
-        """Stop scheduling messages for a user"""
-        if user_id in self.scheduled_tasks:
-            self.scheduled_tasks[user_id].cancel()
-            del self.scheduled_tasks[user_id] 
\ No newline at end of file
+        """Stop scheduling messages for a user and forget their job"""
+        self.next_fire.pop(user_id, None)
+        self.callbacks.pop(user_id, None)
+        self.paused.discard(user_id)
+        self.db.execute("DELETE FROM scheduler_jobs WHERE user_id = ?", (user_id,))
+        self._notify_stopped(user_id)
+
+    def _notify_stopped(self, user_id: int):
+        for listener in self.stop_listeners:
+            listener(user_id)
+
+    async def _on_due(self, _: float, payloads: List[Tuple[int, float, bool]]):
+        user_id, fire_at, prepare = payloads[0]
+        if prepare:
+            self._timers.track(self.prepare_callback(user_id, fire_at))
+        else:
+            self._fire(user_id)
+
+    def _fire(self, user_id: int):
+        callback = self.callbacks.get(user_id) or self.default_callback
+        # Schedule the next message before running this one so a slow callback can't stall the loop
+        self._set_next_fire(user_id, self.compute_next_fire(user_id))
+        if callback is None:
+            return
+        self._timers.track(callback(user_id))
+
+    async def stop(self):
+        """Stop the loop and cancel running jobs; the database stays open until close"""
+        await self._timers.close()
+
+    async def close(self):
+        await self.stop()
+        try:
+            await self.db.flush()
+        finally:
+            await self.db.close()
\ No newline at end of file
@@ -0,0 +1,105 @@
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+from src.utils.sqlite import SQLiteWriter
+
+def _to_epoch(value: Optional[datetime]) -> Optional[float]:
+    return value.timestamp() if value else None
+
+def _from_epoch(value: Optional[float], tz=None) -> Optional[datetime]:
+    return datetime.fromtimestamp(value, tz) if value is not None else None
+
+class TaskStore:
+    """SQLite-backed task storage: one row per task, one statement per mutation.
+
+    Writes are queued to a background writer and committed atomically, so a
+    mutation costs O(1) regardless of how many tasks the user has.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS tasks (
+            id TEXT PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            title TEXT NOT NULL,
+            due_date REAL,
+            completed INTEGER NOT NULL DEFAULT 0,
+            created_at REAL NOT NULL,
+            completed_at REAL,
+            reminded_at REAL
+        );
+        CREATE INDEX IF NOT EXISTS idx_tasks_user_completed ON tasks (user_id, completed, created_at);
+        CREATE INDEX IF NOT EXISTS idx_tasks_completed_due_date ON tasks (completed, due_date);
+    """
+
+    def __init__(self, path: str):
+        self.db = SQLiteWriter(path, self.SCHEMA)
+        self._migrate()
+
+    def _migrate(self):
+        # Databases created before reminders existed lack reminded_at
+        columns = {row["name"] for row in self.db.query("PRAGMA table_info(tasks)")}
+        if "reminded_at" not in columns:
+            self.db.execute("ALTER TABLE tasks ADD COLUMN reminded_at REAL")
+            self.db.flush_sync()
+
+    def insert(self, user_id: int, task: Dict):
+        self.db.execute(
+            """
+            INSERT OR IGNORE INTO tasks (id, user_id, title, due_date, completed, created_at, completed_at, reminded_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                task["id"], user_id, task["title"], _to_epoch(task["due_date"]),
+                int(task["completed"]), _to_epoch(task["created_at"]),
+                _to_epoch(task.get("completed_at")), _to_epoch(task.get("reminded_at"))
+            )
+        )
+
+    def mark_completed(self, task_id: str, completed_at: datetime):
+        self.db.execute(
+            "UPDATE tasks SET completed = 1, completed_at = ? WHERE id = ?",
+            (completed_at.timestamp(), task_id)
+        )
+
+    def mark_reminded(self, task_id: str, reminded_at: datetime):
+        self.db.execute("UPDATE tasks SET reminded_at = ? WHERE id = ?", (reminded_at.timestamp(), task_id))
+
+    @staticmethod
+    def _row_to_dict(row) -> Dict:
+        return {
+            "id": row["id"],
+            "user_id": row["user_id"],
+            "title": row["title"],
+            # Due dates are entered in UTC; created/completed times are local like Task.created_at
+            "due_date": _from_epoch(row["due_date"], timezone.utc),
+            "completed": bool(row["completed"]),
+            "created_at": _from_epoch(row["created_at"]),
+            "completed_at": _from_epoch(row["completed_at"]),
+            "reminded_at": _from_epoch(row["reminded_at"])
+        }
+
+    async def load_user(self, user_id: int) -> List[Dict]:
+        rows = await self.db.query_async(
+            "SELECT * FROM tasks WHERE user_id = ? ORDER BY created_at",
+            (user_id,)
+        )
+        return [self._row_to_dict(row) for row in rows]
+
+    async def load_pending_reminders(self) -> List[Tuple[int, str, float]]:
+        """(user_id, task_id, due timestamp) of every open task still awaiting its reminder"""
+        rows = await self.db.query_async(
+            """
+            SELECT user_id, id, due_date FROM tasks
+            WHERE completed = 0 AND due_date IS NOT NULL AND reminded_at IS NULL
+            ORDER BY due_date
+            """
+        )
+        return [(row["user_id"], row["id"], row["due_date"]) for row in rows]
+
+    async def flush(self):
+        await self.db.flush()
+
+    async def close(self):
+        try:
+            await self.db.flush()
+        finally:
+            await self.db.close()
\ No newline at end of file
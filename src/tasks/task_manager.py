@@ -1,71 +1,172 @@
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import Callable, List, Dict, Optional, Set
+import asyncio
 import json
+import logging
 import os
+import uuid
+from src.tasks.storage import TaskStore
+
+logger = logging.getLogger(__name__)
 
 class Task:
-    def __init__(self, title: str, due_date: Optional[datetime] = None, completed: bool = False):
+    def __init__(
+        self,
+        title: str,
+        due_date: Optional[datetime] = None,
+        completed: bool = False,
+        task_id: Optional[str] = None
+    ):
+        self.id = task_id or uuid.uuid4().hex
         self.title = title
         self.due_date = due_date
         self.completed = completed
         self.created_at = datetime.now()
-    
+        self.completed_at: Optional[datetime] = None
+        self.reminded_at: Optional[datetime] = None
+
     def to_dict(self) -> Dict:
         return {
+            "id": self.id,
             "title": self.title,
             "due_date": self.due_date.isoformat() if self.due_date else None,
             "completed": self.completed,
-            "created_at": self.created_at.isoformat()
+            "created_at": self.created_at.isoformat(),
+            "completed_at": self.completed_at.isoformat() if self.completed_at else None
         }
-    
+
     @classmethod
     def from_dict(cls, data: Dict) -> 'Task':
-        task = cls(data["title"])
+        task = cls(data["title"], task_id=data.get("id"))
         task.completed = data["completed"]
         task.created_at = datetime.fromisoformat(data["created_at"])
         if data["due_date"]:
             task.due_date = datetime.fromisoformat(data["due_date"])
+        if data.get("completed_at"):
+            task.completed_at = datetime.fromisoformat(data["completed_at"])
+        return task
+
+    @classmethod
+    def from_row(cls, row: Dict) -> 'Task':
+        task = cls(row["title"], row["due_date"], row["completed"], task_id=row["id"])
+        task.created_at = row["created_at"]
+        task.completed_at = row["completed_at"]
+        task.reminded_at = row["reminded_at"]
         return task
 
+    def to_row(self) -> Dict:
+        return {
+            "id": self.id,
+            "title": self.title,
+            "due_date": self.due_date,
+            "completed": self.completed,
+            "created_at": self.created_at,
+            "completed_at": self.completed_at,
+            "reminded_at": self.reminded_at
+        }
+
 class TaskManager:
-    def __init__(self, storage_dir: str = "data"):
+    def __init__(self, storage_dir: str = "data", db_path: Optional[str] = None):
+        # storage_dir holds legacy tasks_{user_id}.json files, imported on first load
         self.storage_dir = storage_dir
-        self.tasks: Dict[int, List[Task]] = {}
-        os.makedirs(storage_dir, exist_ok=True)
-    
+        self.store = TaskStore(db_path or os.path.join(storage_dir, "kurisu.db"))
+        # Per user, keyed by task id in creation order
+        self.tasks: Dict[int, Dict[str, Task]] = {}
+        self._loaded: Set[int] = set()
+        self._load_locks: Dict[int, asyncio.Lock] = {}
+        # Called with (user_id, task) whenever a task is added
+        self.task_listeners: List[Callable[[int, Task], None]] = []
+
     def _get_user_file(self, user_id: int) -> str:
         return os.path.join(self.storage_dir, f"tasks_{user_id}.json")
-    
-    def load_tasks(self, user_id: int):
+
+    def _read_legacy_file(self, user_id: int) -> List[Task]:
         file_path = self._get_user_file(user_id)
-        if os.path.exists(file_path):
-            with open(file_path, 'r') as f:
-                data = json.load(f)
-                self.tasks[user_id] = [Task.from_dict(task_data) for task_data in data]
-    
-    def save_tasks(self, user_id: int):
+        if not os.path.exists(file_path):
+            return []
+        with open(file_path, 'r') as f:
+            raw_tasks = json.load(f)
+
+        tasks = []
+        for index, task_data in enumerate(raw_tasks):
+            if not task_data.get("id"):
+                # Legacy files predate task ids; derive a stable one so a retried import can't duplicate tasks
+                seed = f"{user_id}:{index}:{task_data['created_at']}:{task_data['title']}"
+                task_data = {**task_data, "id": uuid.uuid5(uuid.NAMESPACE_OID, seed).hex}
+            tasks.append(Task.from_dict(task_data))
+        return tasks
+
+    def _retire_legacy_file(self, user_id: int):
         file_path = self._get_user_file(user_id)
-        with open(file_path, 'w') as f:
-            json.dump([task.to_dict() for task in self.tasks.get(user_id, [])], f)
-    
+        os.replace(file_path, file_path + ".migrated")
+
+    async def load_tasks(self, user_id: int):
+        """Load a user's tasks from storage once; later calls are no-ops"""
+        if user_id in self._loaded:
+            return
+
+        async with self._load_locks.setdefault(user_id, asyncio.Lock()):
+            if user_id in self._loaded:
+                return
+
+            rows = await self.store.load_user(user_id)
+            loaded = {row["id"]: Task.from_row(row) for row in rows}
+
+            # A legacy file that is still here means its import never finished; inserts are idempotent
+            legacy = await asyncio.to_thread(self._read_legacy_file, user_id)
+            if legacy:
+                for task in legacy:
+                    if task.id not in loaded:
+                        loaded[task.id] = task
+                        self.store.insert(user_id, task.to_row())
+                # Only retire the JSON file once every insert is committed; flush raises if any failed
+                await self.store.flush()
+                await asyncio.to_thread(self._retire_legacy_file, user_id)
+                logger.info(f"Imported {len(legacy)} tasks for {user_id} from legacy JSON storage")
+
+            # Keep anything added while the load was in flight
+            loaded.update(self.tasks.get(user_id, {}))
+            self.tasks[user_id] = loaded
+            self._loaded.add(user_id)
+
     def add_task(self, user_id: int, title: str, due_date: Optional[datetime] = None) -> Task:
-        if user_id not in self.tasks:
-            self.tasks[user_id] = []
-        
         task = Task(title, due_date)
-        self.tasks[user_id].append(task)
-        self.save_tasks(user_id)
+        self.tasks.setdefault(user_id, {})[task.id] = task
+        self.store.insert(user_id, task.to_row())
+        for listener in self.task_listeners:
+            listener(user_id, task)
         return task
-    
+
     def get_tasks(self, user_id: int, include_completed: bool = False) -> List[Task]:
-        tasks = self.tasks.get(user_id, [])
+        tasks = self.tasks.get(user_id, {}).values()
         if not include_completed:
-            tasks = [task for task in tasks if not task.completed]
-        return tasks
-    
+            return [task for task in tasks if not task.completed]
+        return list(tasks)
+
+    def get_task(self, user_id: int, task_id: str) -> Optional[Task]:
+        return self.tasks.get(user_id, {}).get(task_id)
+
     def complete_task(self, user_id: int, task_index: int) -> bool:
-        if user_id in self.tasks and 0 <= task_index < len(self.tasks[user_id]):
-            self.tasks[user_id][task_index].completed = True
-            self.save_tasks(user_id)
-            return True
-        return False 
\ No newline at end of file
+        """Complete the task at `task_index` in the pending list shown by /list_tasks"""
+        tasks = self.get_tasks(user_id)
+        if 0 <= task_index < len(tasks):
+            return self.complete_task_by_id(user_id, tasks[task_index].id)
+        return False
+
+    def complete_task_by_id(self, user_id: int, task_id: str) -> bool:
+        task = self.get_task(user_id, task_id)
+        if task is None or task.completed:
+            return False
+        task.completed = True
+        task.completed_at = datetime.now()
+        self.store.mark_completed(task.id, task.completed_at)
+        return True
+
+    def mark_reminded(self, user_id: int, task_id: str):
+        task = self.get_task(user_id, task_id)
+        if task is not None:
+            task.reminded_at = datetime.now()
+            self.store.mark_reminded(task.id, task.reminded_at)
+
+    async def close(self):
+        await self.store.close()
\ No newline at end of file
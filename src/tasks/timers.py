@@ -0,0 +1,113 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from typing import Any, Awaitable, Callable, Hashable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Called with the due time and the payloads of every entry popped together
+DueHandler = Callable[[float, List[Any]], Awaitable[None]]
+
+class TimerHeap:
+    """Runs a handler at wall-clock times from a single asyncio task.
+
+    Entries sit in a min-heap keyed on due time; the loop sleeps until the
+    earliest one and is woken early when something sooner is pushed. Owners
+    never remove entries: `is_stale` lets them be discarded lazily when they
+    reach the top. Entries with the same due time and `batch_key` are handed
+    to the handler together. Slow work should go through `track` so it runs
+    in the background instead of holding up later entries.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        handler: DueHandler,
+        is_stale: Optional[Callable[[float, Any], bool]] = None,
+        batch_key: Optional[Callable[[Any], Hashable]] = None
+    ):
+        self.name = name
+        self.handler = handler
+        self.is_stale = is_stale
+        self.batch_key = batch_key
+        # (due_at, seq, payload)
+        self._heap: List[Tuple[float, int, Any]] = []
+        self._counter = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop_task: Optional[asyncio.Task] = None
+        self._in_flight: Set[asyncio.Task] = set()
+
+    def push(self, due_at: float, payload: Any):
+        entry = (due_at, next(self._counter), payload)
+        heapq.heappush(self._heap, entry)
+        # Only wake the loop if this is now the earliest entry
+        if self._wakeup is not None and self._heap[0] is entry:
+            self._wakeup.set()
+
+    def start(self):
+        self._wakeup = asyncio.Event()
+        self._loop_task = asyncio.create_task(self._run())
+
+    def _discard_stale(self):
+        if self.is_stale is None:
+            return
+        while self._heap and self.is_stale(self._heap[0][0], self._heap[0][2]):
+            heapq.heappop(self._heap)
+
+    async def _run(self):
+        while True:
+            self._discard_stale()
+            if not self._heap:
+                await self._wakeup.wait()
+                self._wakeup.clear()
+                continue
+
+            delay = self._heap[0][0] - time.time()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+
+            due_at, _, payload = heapq.heappop(self._heap)
+            payloads = [payload]
+            if self.batch_key is not None:
+                key = self.batch_key(payload)
+                # Entries pushed together share a due time and sit next to each other
+                while True:
+                    self._discard_stale()
+                    if not self._heap or self._heap[0][0] != due_at or self.batch_key(self._heap[0][2]) != key:
+                        break
+                    payloads.append(heapq.heappop(self._heap)[2])
+
+            try:
+                await self.handler(due_at, payloads)
+            except Exception as e:
+                logger.error(f"{self.name} failed: {e}", exc_info=True)
+
+    def track(self, coro: Awaitable[None]):
+        """Run a job in the background; it is cancelled on close"""
+        job = asyncio.create_task(coro)
+        self._in_flight.add(job)
+        job.add_done_callback(self._job_done)
+
+    def _job_done(self, job: asyncio.Task):
+        self._in_flight.discard(job)
+        if not job.cancelled() and job.exception() is not None:
+            logger.error(f"{self.name} job failed: {job.exception()}")
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    async def close(self):
+        tasks = list(self._in_flight)
+        if self._loop_task is not None:
+            tasks.append(self._loop_task)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._loop_task = None
@@ -1,5 +1,6 @@
 from functools import wraps
 from telegram import Update
+from telegram.error import RetryAfter
 from telegram.ext import ContextTypes
 from config.config import config
 
@@ -16,4 +17,11 @@ def authorized_only():
             
             return await func(self, update, context, *args, **kwargs)
         return wrapped
-    return decorator 
\ No newline at end of file
+    return decorator
+
+def retry_after_seconds(error: RetryAfter) -> float:
+    """Flood-wait from a RetryAfter error; newer PTB versions report a timedelta"""
+    retry_after = error.retry_after
+    if not isinstance(retry_after, (int, float)):
+        retry_after = retry_after.total_seconds()
+    return float(retry_after)
\ No newline at end of file
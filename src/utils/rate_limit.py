@@ -0,0 +1,51 @@
+import asyncio
+import time
+
+class TokenBucket:
+    """Async token bucket shared by every caller of a rate-limited API.
+
+    `pause` lets a Retry-After response hold back all callers at once instead
+    of each request sleeping (and then retrying) on its own. A rate of 0
+    disables the limit but still honours pauses.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        if now > self._updated:
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+
+    def pause(self, seconds: float):
+        """Block all acquirers for at least `seconds` and drain the burst allowance"""
+        until = time.monotonic() + seconds
+        if until > self._blocked_until:
+            self._blocked_until = until
+            self._tokens = 0.0
+            self._updated = until
+
+    async def acquire(self, tokens: float = 1.0):
+        # Waiters queue on the lock, so tokens are handed out in FIFO order
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._blocked_until:
+                    await asyncio.sleep(self._blocked_until - now)
+                    continue
+
+                # A rate of 0 turns off the limit, but a pause still applies
+                if self.rate <= 0:
+                    return
+
+                self._refill(now)
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
\ No newline at end of file
@@ -0,0 +1,160 @@
+import asyncio
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from typing import Any, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+def connect(path: str) -> sqlite3.Connection:
+    """Open a connection configured for concurrent readers and a single writer"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    conn = sqlite3.connect(path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA foreign_keys=ON")
+    return conn
+
+class SQLiteWriteError(sqlite3.Error):
+    """One or more queued writes failed; `errors` holds (sql, params, exception) per failed statement"""
+
+    def __init__(self, path: str, errors: List[Tuple[str, Sequence, Exception]]):
+        super().__init__(f"{len(errors)} write(s) to {path} failed, first: {errors[0][2]}")
+        self.errors = errors
+
+class _FlushRequest:
+    def __init__(self):
+        self.done = threading.Event()
+        self.errors: List[Tuple[str, Sequence, Exception]] = []
+
+class SQLiteWriter:
+    """Runs writes on a background thread, committing them in batches.
+
+    `execute` only enqueues, so the event loop never waits on disk. Reads go
+    through per-thread connections; with WAL they don't block the writer.
+    If a batch fails it is replayed statement by statement, so only the bad
+    writes are dropped; they are reported to the next `flush`.
+    """
+
+    def __init__(self, path: str, schema: str = "", batch_size: int = 100, flush_interval: float = 0.5):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue[Any]" = queue.Queue()
+        self._local = threading.local()
+        # Failed writes since the last flush request, only touched by the writer thread
+        self._failed: List[Tuple[str, Sequence, Exception]] = []
+
+        # Schema is created synchronously so readers can rely on it straight away
+        conn = connect(path)
+        try:
+            if schema:
+                conn.executescript(schema)
+            conn.commit()
+        finally:
+            conn.close()
+
+        self._thread = threading.Thread(target=self._run, name=f"sqlite-writer:{os.path.basename(path)}", daemon=True)
+        self._thread.start()
+
+    def execute(self, sql: str, params: Sequence = ()):
+        self._queue.put((sql, params))
+
+    @staticmethod
+    def _is_marker(entry: Any) -> bool:
+        # None stops the writer
+        return entry is None or isinstance(entry, _FlushRequest)
+
+    def _write_batch(self, conn: sqlite3.Connection, statements: List[Tuple[str, Sequence]]):
+        try:
+            for statement in statements:
+                conn.execute(*statement)
+            conn.commit()
+            return
+        except sqlite3.Error as e:
+            conn.rollback()
+            if len(statements) == 1:
+                sql, params = statements[0]
+                logger.error(f"Failed to write to {self.path}: {e} ({sql.strip()[:80]})")
+                self._failed.append((sql, params, e))
+                return
+            logger.warning(f"Batch write to {self.path} failed ({e}), retrying statements one by one")
+
+        # Each statement in its own transaction so one bad write can't take the rest down with it
+        for statement in statements:
+            self._write_batch(conn, [statement])
+
+    def _run(self):
+        conn = connect(self.path)
+        try:
+            while True:
+                batch = [self._queue.get()]
+                # Collect whatever else arrives within flush_interval into the same transaction
+                deadline = time.monotonic() + self.flush_interval
+                while len(batch) < self.batch_size and not self._is_marker(batch[-1]):
+                    try:
+                        batch.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                    except queue.Empty:
+                        break
+
+                stop = False
+                waiters = []
+                statements = []
+                for entry in batch:
+                    if entry is None:
+                        stop = True
+                    elif isinstance(entry, _FlushRequest):
+                        waiters.append(entry)
+                    else:
+                        statements.append(entry)
+                if statements:
+                    self._write_batch(conn, statements)
+
+                if waiters:
+                    failed, self._failed = self._failed, []
+                    for waiter in waiters:
+                        waiter.errors = failed
+                        waiter.done.set()
+                if stop:
+                    return
+        finally:
+            conn.close()
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = connect(self.path)
+        return conn
+
+    def query(self, sql: str, params: Sequence = ()) -> List[sqlite3.Row]:
+        return self._connection().execute(sql, params).fetchall()
+
+    async def query_async(self, sql: str, params: Sequence = ()) -> List[sqlite3.Row]:
+        return await asyncio.to_thread(self.query, sql, params)
+
+    def flush_sync(self, timeout: Optional[float] = None):
+        request = _FlushRequest()
+        self._queue.put(request)
+        request.done.wait(timeout)
+        if request.errors:
+            raise SQLiteWriteError(self.path, request.errors)
+
+    async def flush(self):
+        """Wait until every write queued so far is committed.
+
+        Raises SQLiteWriteError if any write since the previous flush failed.
+        """
+        if self._thread.is_alive():
+            await asyncio.to_thread(self.flush_sync)
+
+    async def close(self):
+        if self._thread.is_alive():
+            self._queue.put(None)
+            await asyncio.to_thread(self._thread.join)
\ No newline at end of file